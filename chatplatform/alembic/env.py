@@ -7,7 +7,7 @@ from sqlalchemy import pool
 from alembic import context
 from chatplatform.db.base_class import Base  # Import Base from the correct module
 from chatplatform.db.models import (admin, external_user, chat_session, course, document, refresh_token,
-                       user_course_association, gpt_preset)
+                       user_course_association, gpt_preset, indexing_job)
 
 # Correctly retrieve the DATABASE_URL from the environment variables
 database_url = os.getenv("DATABASE_URL")
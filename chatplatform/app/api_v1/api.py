@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from .endpoints import auth, websocket, course, document, gpt_preset
+from .endpoints import auth, websocket, course, document, gpt_preset, health
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
@@ -7,3 +7,4 @@ api_router.include_router(course.router, prefix="/courses", tags=["Courses"])
 api_router.include_router(document.router, prefix="/documents", tags=["Documents"])
 api_router.include_router(gpt_preset.router, prefix="/preset", tags=["Preset"])
 api_router.include_router(websocket.router, prefix="/chat", tags=["Chat"])
+api_router.include_router(health.router, prefix="/health", tags=["Health"])
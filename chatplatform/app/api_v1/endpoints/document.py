@@ -4,8 +4,9 @@ from sqlalchemy.orm import Session
 from chatplatform.app.api_v1.endpoints.auth import get_current_active_user
 from chatplatform.db.models.admin import AdminUser
 from chatplatform.db.session import DBSession
-from chatplatform.schemas.document import DocumentOut, DocumentsResponse
+from chatplatform.schemas.document import DocumentOut, DocumentsResponse, IndexingJobOut
 from chatplatform.services.document_service import DocumentService
+from chatplatform.services.indexing_job_service import IndexingJobService
 
 router = APIRouter()
 
@@ -26,6 +27,24 @@ async def get_document_by_id(document_id: int, db_session: Session = Depends(DBS
     return document
 
 
+@router.get("/jobs/{job_id}", response_model=IndexingJobOut)
+def get_indexing_job(job_id: int, db_session: Session = Depends(DBSession.get_db),
+                     current_user: AdminUser = Depends(get_current_active_user)):
+    job = IndexingJobService(db=db_session).get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Indexing job not found")
+    return job
+
+
+@router.get("/{document_id}/indexing", response_model=IndexingJobOut)
+def get_document_indexing_status(document_id: int, db_session: Session = Depends(DBSession.get_db),
+                                 current_user: AdminUser = Depends(get_current_active_user)):
+    job = IndexingJobService(db=db_session).get_latest_job_for_document(document_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No indexing job for document")
+    return job
+
+
 @router.post("/upload/{course_id}", response_model=DocumentOut)
 async def upload_document_endpoint(course_id: int, file: UploadFile = File(...),
                                    db_session: Session = Depends(DBSession.get_db),
@@ -0,0 +1,55 @@
+from fastapi import APIRouter
+from llama_index.core import Settings
+from starlette import status
+from starlette.responses import JSONResponse
+
+from chatplatform.services.agent_pool_service import agent_pool
+from chatplatform.services.answer_cache_service import answer_cache
+from chatplatform.services.event_loop_monitor import event_loop_monitor
+from chatplatform.services.gpt_chat_service import response_time, time_to_first_token
+from chatplatform.services.index_cache_service import index_cache
+from chatplatform.services.llm_hedging_service import hedged_calls
+from chatplatform.services.llm_scheduler_service import llm_scheduler
+from chatplatform.services.model_router_service import model_router
+from chatplatform.services.reranker_service import reranker_service
+from chatplatform.services.request_coalescing_service import request_coalescer
+from chatplatform.services.warmup_service import readiness
+
+router = APIRouter()
+
+
+@router.get("/live")
+def live():
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+def ready():
+    if not readiness.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "warming_up"})
+    return {
+        "status": "ready",
+        "warmup_seconds": readiness.warmup_seconds,
+        "warmed_courses": readiness.warmed_courses,
+    }
+
+
+@router.get("/stats")
+def stats():
+    embed_model = Settings.embed_model
+    return {
+        "index_cache": index_cache.stats(),
+        "reranker": reranker_service.stats(),
+        "embedding_cache": embed_model.stats() if hasattr(embed_model, "stats") else None,
+        "agent_pool": agent_pool.stats(),
+        "answer_cache": answer_cache.stats(),
+        "coalescing": request_coalescer.stats(),
+        "event_loop": event_loop_monitor.stats(),
+        "model_router": model_router.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_calls": hedged_calls.stats(),
+        "chat": {
+            "time_to_first_token": time_to_first_token.stats(),
+            "response_time": response_time.stats(),
+        },
+    }
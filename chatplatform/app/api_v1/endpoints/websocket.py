@@ -34,6 +34,7 @@ def disconnect(websocket: WebSocket):
 async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Depends(DBSession.get_db)):
     websocket_service = WebSocketService(db)
     course_service = CourseService(db)
+    conversation = None
     logging.info(f"WebSocket connection attempt with token: {token}")
     try:
         admin_id, user_type = await websocket_service.verify_external_token(token)
@@ -47,8 +48,10 @@ async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Dep
         setup_data_json = json.loads(setup_data)
 
         username = setup_data_json.get('username')
+        preset_id = setup_data_json.get('preset_id')
         user = await websocket_service.get_or_create_external_user(username, admin_id)
         allocated_courses = await course_service.get_courses_by_admin_id(admin_id)
+        conversation = websocket_service.start_conversation(user, allocated_courses, admin_id, preset_id)
 
         while True:
             text_data = await websocket.receive_text()
@@ -56,12 +59,19 @@ async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Dep
             message = data_json['message']
 
             # Use the WebSocketService to handle business logic
-            async for response_chunk in websocket_service.generate_gpt_responses(message, allocated_courses):
-                if response_chunk:
-                    await websocket.send_text(json.dumps({"message": response_chunk}))
-                else:
-                    await websocket.send_text(json.dumps({"error": "Failed to get response from GPT."}))
-                    break
+            frames = websocket_service.generate_gpt_responses(message, allocated_courses, admin_id,
+                                                              preset_id, conversation)
+            try:
+                async for frame in frames:
+                    await websocket.send_text(json.dumps(frame))
+                    if "error" in frame:
+                        break
+            finally:
+                # Unsubscribes from a shared answer right away when the client has gone.
+                await frames.aclose()
     except WebSocketDisconnect:
         disconnect(websocket)
         logging.info("WebSocket connection closed")
+    finally:
+        if conversation is not None:
+            websocket_service.end_conversation(conversation)
@@ -1,3 +1,5 @@
+import asyncio
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,6 +8,9 @@ from chatplatform.core.config import logger
 
 
 from chatplatform.app.api_v1.api import api_router
+from chatplatform.services.event_loop_monitor import event_loop_monitor
+from chatplatform.services.warmup_service import readiness, run_index_garbage_collection, run_warmup, \
+    save_course_usage
 from chatplatform.websocket.connection_manager import ConnectionManager
 
 app = FastAPI(
@@ -31,6 +36,19 @@ manager = ConnectionManager(rabbitmq_url=settings.RABBITMQ_URL)
 @app.on_event("startup")
 async def startup_event():
     await manager.connect_to_rabbitmq()
+    event_loop_monitor.start()
+    app.state.index_gc_task = asyncio.create_task(run_index_garbage_collection())
+    if settings.WARMUP_ENABLED:
+        # Runs in the background; /health/ready reports 503 until it completes.
+        app.state.warmup_task = asyncio.create_task(run_warmup())
+    else:
+        readiness.ready = True
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    event_loop_monitor.stop()
+    save_course_usage()
 
 
 if __name__ == "__main__":
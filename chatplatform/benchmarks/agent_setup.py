@@ -0,0 +1,76 @@
+"""
+Measures the per-message agent setup time with and without the agent pool.
+
+Sends the same questions through the chat pipeline once with a fresh course tool per message and once with
+pooled tools, and reports the setup time recorded by the pool next to time to first token and total time.
+Run it against chatplatform.benchmarks.fake_openai so the LLM latency stays constant between the two runs,
+for an admin whose courses are indexed and answered in agent mode.
+
+Usage:
+    python -m chatplatform.benchmarks.fake_openai --port 8100
+    OPENAI_API_BASE=http://localhost:8100/v1 python -m chatplatform.benchmarks.agent_setup --admin-id 1 --messages 20
+"""
+import argparse
+import asyncio
+
+import numpy as np
+
+from chatplatform.core.config import settings
+from chatplatform.db.session import SessionLocal
+from chatplatform.services.agent_pool_service import agent_pool
+from chatplatform.services.course_service import CourseService
+from chatplatform.services.gpt_chat_service import GptChatService
+from chatplatform.services.latency_metrics import LatencyWindow
+
+QUESTION = "What does the course say about question {}?"
+
+
+async def run_messages(db, admin_id: int, message_count: int, pooled: bool) -> dict:
+    agent_pool.enabled = pooled
+    agent_pool.clear()
+    agent_pool.setup_time = LatencyWindow()
+    courses = await CourseService(db).get_courses_by_admin_id(admin_id)
+    first_token_ms, duration_ms = [], []
+    for i in range(message_count):
+        done = None
+        async for frame in GptChatService(db).request_nlp(QUESTION.format(i), courses, admin_id):
+            if "error" in frame:
+                raise RuntimeError(f"Message {i} failed: {frame['error']}")
+            if frame.get("done"):
+                done = frame
+        first_token_ms.append(done["time_to_first_token_ms"] or 0.0)
+        duration_ms.append(done["duration_ms"])
+    return {
+        "setup": agent_pool.setup_time.stats(),
+        "first_token_p50_ms": round(float(np.median(first_token_ms)), 1),
+        "duration_p50_ms": round(float(np.median(duration_ms)), 1),
+    }
+
+
+def report(label: str, result: dict) -> None:
+    setup = result["setup"]
+    print(f"{label:10s} setup p50 {setup['p50_ms']} ms, p95 {setup['p95_ms']} ms ({setup['count']} messages)  "
+          f"first token p50 {result['first_token_p50_ms']} ms  total p50 {result['duration_p50_ms']} ms")
+
+
+async def benchmark(admin_id: int, message_count: int) -> None:
+    # Every message has to reach the agent; cached answers would skip the setup being measured.
+    settings.ANSWER_CACHE_ENABLED = False
+    db = SessionLocal()
+    try:
+        report("unpooled", await run_messages(db, admin_id, message_count, pooled=False))
+        report("pooled", await run_messages(db, admin_id, message_count, pooled=True))
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--admin-id", type=int, required=True, help="Admin whose courses are asked about")
+    parser.add_argument("--messages", type=int, default=20, help="Messages sent per run")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.admin_id, args.messages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Local stand-in for the OpenAI chat completion and embedding endpoints, for exercising the chat pipeline
+without network access or API costs.
+
+Chat requests that offer tools and end with a user message are answered with a call to the first tool,
+everything else with a canned answer that is streamed word by word. Latencies are configurable so that
+time to first token and frame coalescing can be observed.
+
+Usage:
+    python -m chatplatform.benchmarks.fake_openai --port 8100 --first-token-delay 0.5 --token-delay 0.02
+    OPENAI_API_BASE=http://localhost:8100/v1 uvicorn chatplatform.app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+EMBEDDING_DIMENSIONS = 1536
+ANSWER = ("Based on the course documents, here is what I found. The material covers the question in "
+          "several places, and the most relevant passages are summarized in this answer.")
+
+app = FastAPI(title="Fake OpenAI")
+app.state.first_token_delay = 0.2
+app.state.token_delay = 0.02
+app.state.requests = 0
+
+
+def fake_embedding(text: str) -> list:
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS).astype(np.float32).tolist()
+
+
+def chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def plan_reply(body: dict) -> dict:
+    """
+    Returns the assistant message the fake model answers with.
+    """
+    messages = body.get("messages", [])
+    tools = body.get("tools") or []
+    if tools and messages and messages[-1].get("role") == "user":
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": tools[0]["function"]["name"],
+                             "arguments": json.dumps({"input": messages[-1].get("content") or ""})},
+            }],
+        }
+    return {"role": "assistant", "content": ANSWER}
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    return {
+        "object": "list",
+        "model": body.get("model"),
+        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(str(text))}
+                 for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.requests += 1
+    model = body.get("model", "gpt-fake")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    reply = plan_reply(body)
+
+    if not body.get("stream"):
+        await asyncio.sleep(app.state.first_token_delay)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": reply,
+                         "finish_reason": "tool_calls" if reply.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    async def events():
+        await asyncio.sleep(app.state.first_token_delay)
+        if reply.get("tool_calls"):
+            tool_call = dict(reply["tool_calls"][0], index=0)
+            yield chunk(completion_id, model, {"role": "assistant", "content": None, "tool_calls": [tool_call]})
+            yield chunk(completion_id, model, {}, finish_reason="tool_calls")
+        else:
+            yield chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for i, word in enumerate(reply["content"].split(" ")):
+                yield chunk(completion_id, model, {"content": word if i == 0 else f" {word}"})
+                await asyncio.sleep(app.state.token_delay)
+            yield chunk(completion_id, model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    args = parser.parse_args()
+    app.state.first_token_delay = args.first_token_delay
+    app.state.token_delay = args.token_delay
+    uvicorn.run(app, host=args.host, port=args.port)
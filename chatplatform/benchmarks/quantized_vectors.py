@@ -0,0 +1,83 @@
+"""
+Measures memory saved and recall@10 lost by quantized vector storage on the persisted course indexes.
+
+Stored chunk embeddings are used as queries, so no embedding API calls are needed. Each query is
+answered exactly on the float32 matrix and then by every quantization mode, with and without
+exact re-scoring of the shortlist.
+
+Usage:
+    python -m chatplatform.benchmarks.quantized_vectors --storage ./storage --queries 200
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from chatplatform.services.index_snapshot_service import IndexSnapshotStore
+from chatplatform.services.numpy_vector_store import EMBEDDINGS_FILENAME, quantize, quantized_scores, top_k_indices
+
+K = 10
+MODES = ("float16", "int8")
+
+
+def recall_at_k(embeddings: np.ndarray, queries: np.ndarray, mode: str, rescore_factor: int) -> float:
+    quantized, scales = quantize(embeddings, mode)
+    recalls = []
+    for query in queries:
+        expected = set(top_k_indices(embeddings @ query, K))
+        approximate = quantized_scores(quantized, scales, query)
+        if rescore_factor > 1:
+            shortlist = top_k_indices(approximate, K * rescore_factor)
+            found = shortlist[top_k_indices(embeddings[shortlist] @ query, K)]
+        else:
+            found = top_k_indices(approximate, K)
+        recalls.append(len(expected.intersection(found)) / len(expected))
+    return float(np.mean(recalls))
+
+
+def quantized_bytes(embeddings: np.ndarray, mode: str) -> int:
+    quantized, scales = quantize(embeddings, mode)
+    return quantized.nbytes + (scales.nbytes if scales is not None else 0)
+
+
+def benchmark_course(course_name: str, embeddings: np.ndarray, query_count: int, rescore_factor: int,
+                     rng: np.random.Generator) -> None:
+    sample = rng.choice(len(embeddings), size=min(query_count, len(embeddings)), replace=False)
+    queries = embeddings[sample]
+    print(f"{course_name}: {len(embeddings)} vectors x {embeddings.shape[1]} dims, "
+          f"float32 {embeddings.nbytes / 1024 ** 2:.2f} MiB")
+    for mode in MODES:
+        size = quantized_bytes(embeddings, mode)
+        print(f"  {mode:8s} {size / 1024 ** 2:8.2f} MiB "
+              f"(saves {1 - size / embeddings.nbytes:6.1%})  "
+              f"recall@{K} raw {recall_at_k(embeddings, queries, mode, 1):.4f}  "
+              f"rescored x{rescore_factor} {recall_at_k(embeddings, queries, mode, rescore_factor):.4f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", default="./storage", help="Index storage directory")
+    parser.add_argument("--queries", type=int, default=200, help="Queries sampled per course")
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Shortlist size as a multiple of k")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    storage_path = Path(args.storage)
+    snapshots = IndexSnapshotStore(storage_path, grace_seconds=0)
+    rng = np.random.default_rng(args.seed)
+    found = False
+    for course_dir in sorted(path for path in storage_path.iterdir() if path.is_dir()):
+        snapshot_path = snapshots.current_path(course_dir.name)
+        if snapshot_path is None or not (snapshot_path / EMBEDDINGS_FILENAME).exists():
+            continue
+        embeddings = np.load(snapshot_path / EMBEDDINGS_FILENAME)
+        if len(embeddings) <= K:
+            continue
+        found = True
+        benchmark_course(course_dir.name, embeddings, args.queries, args.rescore_factor, rng)
+    if not found:
+        print(f"No course indexes with numpy embeddings found under {storage_path}")
+
+
+if __name__ == "__main__":
+    main()
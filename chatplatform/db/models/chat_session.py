@@ -18,6 +18,7 @@ class ChatSession(Base):
     external_user_id = Column(Integer, ForeignKey('external_users.id'), nullable=False)
     external_user = relationship("ExternalUser", backref=backref("chat_sessions", cascade="all, delete-orphan"))
     conversation_history = Column(Text, nullable=True)  # Changed from String to Text
+    summary = Column(Text, nullable=True)  # Compact summary of turns that no longer fit the history budget
 
     def set_conversation_history(self, history):
         self.conversation_history = json.dumps(history)
@@ -34,3 +35,18 @@ class ChatSession(Base):
         """Clears the conversation history."""
         logging.info(f"Clearing conversation history for session {self.id}")
         self.conversation_history = None
+
+
+class ChatSessionMessage(Base):
+    """
+    One message of a chat session. Messages are appended in batches instead of rewriting the whole history.
+    """
+    __tablename__ = "chat_session_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_session_id = Column(Integer, ForeignKey('chat_sessions.id', ondelete="CASCADE"), nullable=False, index=True)
+    role = Column(String(20), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False)
+    chat_session = relationship("ChatSession", backref=backref("messages", cascade="all, delete-orphan",
+                                                               order_by="ChatSessionMessage.id"))
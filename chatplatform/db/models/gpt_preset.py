@@ -12,5 +12,6 @@ class GptPreset(Base):
     model = Column(String, nullable=False)
     max_tokens = Column(Integer, default=150)
     temperature = Column(Float, default=0.7)
+    chat_mode = Column(String(20), nullable=False, default="agent", server_default="agent")  # "agent" or "direct"
     course_id = Column(Integer, ForeignKey('courses.id'), nullable=False)
     course = relationship("Course", backref="gpt_presets")
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP
+
+from chatplatform.db.base_class import Base
+
+
+class IndexingJob(Base):
+    __tablename__ = "indexing_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, nullable=True, index=True)  # No FK, jobs outlive deleted documents
+    course_id = Column(Integer, nullable=False)
+    status = Column(String(50), nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP, nullable=False)
+    started_at = Column(TIMESTAMP, nullable=True)
+    finished_at = Column(TIMESTAMP, nullable=True)
+
+    @property
+    def duration_seconds(self):
+        """Seconds the job spent running, or None if it has not finished."""
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import List
+from enum import Enum
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -30,3 +31,25 @@ class DocumentOut(DocumentBase):
 class DocumentsResponse(BaseModel):
     documents: List[DocumentOut]
     total: int
+
+
+class IndexingJobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class IndexingJobOut(BaseModel):
+    id: int
+    document_id: Optional[int]
+    course_id: int
+    status: str
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    duration_seconds: Optional[float]
+
+    class Config:
+        orm_mode = True
@@ -30,12 +30,18 @@ class GptModelName(Enum):
     GPT3_5_TURBO_16K_0613 = "gpt-3.5-turbo-16k-0613"
 
 
+class ChatMode(Enum):
+    AGENT = "agent"  # Tool-calling agent deciding when to search the course documents
+    DIRECT = "direct"  # Retrieve and rerank locally, then answer with a single completion
+
+
 class GptPresetCreate(BaseModel):
     name: str
     model: GptModelName
     max_tokens: int = 150
     temperature: float = 0.7
     course_id: int  # Add this line
+    chat_mode: ChatMode = ChatMode.AGENT
 
 
 class GptPresetResponseSchema(BaseModel):
@@ -45,6 +51,7 @@ class GptPresetResponseSchema(BaseModel):
     max_tokens: int
     temperature: float
     course_id: int  # Add this line
+    chat_mode: str
 
     class Config:
         orm_mode = True
@@ -119,6 +126,7 @@ class PresetResponse(BaseModel):
     max_tokens: int
     temperature: float
     course_id: int  # Ensure this represents the intended field; the duplicate has been removed for clarity.
+    chat_mode: str
 
     class Config:
         orm_mode = True
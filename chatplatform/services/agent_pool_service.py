@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from llama_index.agent.openai import OpenAIAgent
+from llama_index.core.tools import QueryEngineTool
+
+from chatplatform.core.config import settings, logger
+from chatplatform.services.latency_metrics import LatencyWindow
+
+# (admin id, sorted course names, preset id, model)
+AgentKey = Tuple[int, Tuple[str, ...], Optional[int], str]
+
+
+def agent_key(admin_id: int, course_names: List[str], preset_id: Optional[int], model: str) -> AgentKey:
+    return admin_id, tuple(sorted(set(course_names))), preset_id, model
+
+
+class PooledTool:
+    def __init__(self, tool: QueryEngineTool, versions: Dict[str, Optional[str]]):
+        self.tool = tool
+        self.versions = versions
+        self.last_used = time.monotonic()
+
+
+class AgentPool:
+    """
+    Reuses the course tools of chat agents between messages instead of building one per message.
+
+    Agents sharing an admin, course set, preset and model share one course tool (loaded indexes, retrievers and
+    query engine). The agent itself is cheap and holds the conversation, so every message gets a new one on the
+    pooled tool, started from the session history the caller passes in; pooled state never carries one
+    session's turns into another's. A tool is rebuilt when one of its courses publishes a new index version.
+    Only one build runs per key at a time; concurrent misses wait for it. Entries unused for `idle_seconds` are
+    evicted. A disabled pool builds a new tool for every message, which keeps the setup time metric comparable.
+    """
+
+    def __init__(self, idle_seconds: float, max_entries: int, enabled: bool = True):
+        self.enabled = enabled
+        self.idle_seconds = idle_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[AgentKey, PooledTool]" = OrderedDict()
+        self._build_locks: Dict[AgentKey, asyncio.Lock] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self.setup_time = LatencyWindow()
+
+    async def get_agent(self, key: AgentKey, versions: Dict[str, Optional[str]],
+                        tool_factory: Callable[[], Awaitable[Optional[QueryEngineTool]]],
+                        agent_factory: Callable[[QueryEngineTool], OpenAIAgent]) -> Optional[OpenAIAgent]:
+        """
+        Returns a new agent made by `agent_factory` on the tool for `key`, building the tool with
+        `tool_factory` when it is missing or was built from other index `versions`.
+        """
+        started = time.perf_counter()
+        if not self.enabled:
+            tool = await tool_factory()
+            agent = agent_factory(tool) if tool is not None else None
+            self.setup_time.record(time.perf_counter() - started)
+            return agent
+
+        self.evict_idle()
+        entry = self._current_entry(key, versions)
+        if entry is None:
+            with self._lock:
+                build_lock = self._build_locks.setdefault(key, asyncio.Lock())
+            async with build_lock:
+                # Another request may have built the entry while this one waited.
+                entry = self._current_entry(key, versions)
+                if entry is None:
+                    entry = await self._build(key, versions, tool_factory)
+                    if entry is None:
+                        return None
+
+        agent = agent_factory(entry.tool)
+        entry.last_used = time.monotonic()
+        self.setup_time.record(time.perf_counter() - started)
+        return agent
+
+    def _current_entry(self, key: AgentKey, versions: Dict[str, Optional[str]]) -> Optional[PooledTool]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.versions != versions:
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    async def _build(self, key: AgentKey, versions: Dict[str, Optional[str]],
+                     tool_factory: Callable[[], Awaitable[Optional[QueryEngineTool]]]) -> Optional[PooledTool]:
+        with self._lock:
+            self._misses += 1
+        tool = await tool_factory()
+        if tool is None:
+            return None
+        entry = PooledTool(tool, versions)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget_build_lock(evicted)
+                self._evictions += 1
+        return entry
+
+    def _forget_build_lock(self, key: AgentKey) -> None:
+        # Callers hold self._lock. A lock that is held or awaited stays, so its waiters share the build.
+        build_lock = self._build_locks.get(key)
+        if build_lock is not None and not build_lock.locked():
+            del self._build_locks[key]
+
+    def evict_idle(self) -> None:
+        deadline = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [key for key, entry in self._entries.items() if entry.last_used < deadline]
+            for key in idle:
+                del self._entries[key]
+                self._forget_build_lock(key)
+            self._evictions += len(idle)
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle chat agent entries")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "setup_time": self.setup_time.stats(),
+            }
+
+
+agent_pool = AgentPool(settings.AGENT_POOL_IDLE_SECONDS, settings.AGENT_POOL_MAX_ENTRIES,
+                       enabled=settings.AGENT_POOL_ENABLED)
@@ -0,0 +1,166 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from chatplatform.core.config import settings, logger
+
+# (sorted course names, preset id)
+AnswerScope = Tuple[Tuple[str, ...], Optional[int]]
+# Misses whose best similarity is this close below the threshold are counted as near misses.
+NEAR_MISS_MARGIN = 0.05
+NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+QUOTED = re.compile(r"\"([^\"]+)\"|“([^”]+)”|«([^»]+)»|(?<!\w)'([^']+)'(?!\w)")
+
+
+def answer_scope(course_names: List[str], preset_id: Optional[int] = None) -> AnswerScope:
+    return tuple(sorted(set(course_names))), preset_id
+
+
+def question_facts(question: str) -> FrozenSet[str]:
+    """
+    Numbers and quoted names in a question. Questions differing only in these embed almost identically
+    ("assignment 3" vs "assignment 4") but need different answers.
+    """
+    quoted = {next(group for group in match.groups() if group) for match in QUOTED.finditer(question)}
+    return frozenset(NUMBER.findall(question)) | frozenset(" ".join(text.lower().split()) for text in quoted)
+
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    sources: List[str]
+    similarity: float
+
+
+class AnswerCacheEntry:
+    def __init__(self, scope: AnswerScope, embedding: np.ndarray, facts: FrozenSet[str],
+                 versions: Dict[str, Optional[str]], answer: str, sources: List[str]):
+        self.scope = scope
+        self.embedding = embedding
+        self.facts = facts
+        self.versions = versions
+        self.answer = answer
+        self.sources = sources
+        self.created_at = time.monotonic()
+
+
+class SemanticAnswerCache:
+    """
+    Answers to earlier questions per course set and preset, looked up by embedding similarity of the new
+    question. An entry is only served while it is younger than `ttl_seconds` and was answered from the
+    index versions its courses still have, so reindexing in a worker also retires it. A similar question
+    whose numbers or quoted names differ from the stored one's is not served the stored answer. The least
+    recently used entries are dropped beyond `max_entries`.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, AnswerCacheEntry]" = OrderedDict()
+        self._by_scope: Dict[AnswerScope, Dict[int, AnswerCacheEntry]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._near_misses = 0
+        self._fact_mismatches = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, scope: AnswerScope, question: str, embedding: List[float],
+               versions: Dict[str, Optional[str]]) -> Optional[CachedAnswer]:
+        query = self.normalize(embedding)
+        facts = question_facts(question)
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for entry_id, entry in list(self._by_scope.get(scope, {}).items()):
+                if now - entry.created_at > self.ttl_seconds or entry.versions != versions:
+                    self._remove(entry_id)
+                else:
+                    candidates.append((entry_id, entry))
+            if not candidates:
+                self._misses += 1
+                return None
+
+            similarities = np.stack([entry.embedding for _, entry in candidates]) @ query
+            best_similarity = float(similarities.max())
+            for best in np.argsort(-similarities):
+                similarity = float(similarities[best])
+                if similarity < self.threshold:
+                    break
+                entry_id, entry = candidates[best]
+                if entry.facts == facts:
+                    self._entries.move_to_end(entry_id)
+                    self._hits += 1
+                    return CachedAnswer(entry.answer, entry.sources, similarity)
+
+            self._misses += 1
+            if best_similarity >= self.threshold:
+                self._fact_mismatches += 1
+            elif best_similarity >= self.threshold - NEAR_MISS_MARGIN:
+                self._near_misses += 1
+            return None
+
+    def store(self, scope: AnswerScope, question: str, embedding: List[float], versions: Dict[str, Optional[str]],
+              answer: str, sources: List[str]) -> None:
+        entry = AnswerCacheEntry(scope, self.normalize(embedding), question_facts(question), versions, answer,
+                                 sources)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_scope.setdefault(scope, {})[entry_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_course(self, course_name: str) -> None:
+        """
+        Drops every answer that involved the course, e.g. after one of its documents changed.
+        """
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items() if course_name in entry.scope[0]]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self._invalidations += len(stale)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answers for {course_name}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        scope_entries = self._by_scope[entry.scope]
+        del scope_entries[entry_id]
+        if not scope_entries:
+            del self._by_scope[entry.scope]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "near_misses": self._near_misses,
+                "fact_mismatches": self._fact_mismatches,
+                "invalidations": self._invalidations,
+            }
+
+
+answer_cache = SemanticAnswerCache(settings.ANSWER_CACHE_THRESHOLD, settings.ANSWER_CACHE_TTL_SECONDS,
+                                   settings.ANSWER_CACHE_MAX_ENTRIES)
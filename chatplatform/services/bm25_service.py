@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.storage.docstore.types import BaseDocumentStore
+
+from chatplatform.core.config import logger
+
+BM25_FILENAME = "bm25.json"
+# Keeps codes such as "CS-101", "v2.3" or "SKU_4410" together as single terms.
+TOKEN_PATTERN = re.compile(r"\w(?:[\w\-.]*\w)?", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring over the nodes of one course.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.ref_doc_ids: Dict[str, Optional[str]] = {}
+        self.total_length = 0
+
+    @classmethod
+    def from_docstore(cls, docstore: BaseDocumentStore) -> "BM25Index":
+        lexical_index = cls()
+        for node in docstore.docs.values():
+            lexical_index.add(node.node_id, node.get_content(metadata_mode=MetadataMode.NONE), node.ref_doc_id)
+        return lexical_index
+
+    @classmethod
+    def load(cls, persist_dir: Path) -> Optional["BM25Index"]:
+        path = Path(persist_dir) / BM25_FILENAME
+        if not path.exists():
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        lexical_index = cls(k1=data["k1"], b=data["b"])
+        lexical_index.postings = data["postings"]
+        lexical_index.doc_lengths = data["doc_lengths"]
+        lexical_index.ref_doc_ids = data["ref_doc_ids"]
+        lexical_index.total_length = sum(lexical_index.doc_lengths.values())
+        return lexical_index
+
+    def persist(self, persist_dir: Path) -> None:
+        path = Path(persist_dir) / BM25_FILENAME
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "postings": self.postings,
+                       "doc_lengths": self.doc_lengths, "ref_doc_ids": self.ref_doc_ids}, f)
+        os.replace(tmp_path, path)
+
+    def add(self, node_id: str, text: str, ref_doc_id: Optional[str] = None) -> None:
+        if node_id in self.doc_lengths:
+            self.remove_nodes([node_id])
+        counts = Counter(tokenize(text))
+        for term, frequency in counts.items():
+            self.postings.setdefault(term, {})[node_id] = frequency
+        length = sum(counts.values())
+        self.doc_lengths[node_id] = length
+        self.ref_doc_ids[node_id] = ref_doc_id
+        self.total_length += length
+
+    def add_ref_doc(self, docstore: BaseDocumentStore, ref_doc_id: str) -> None:
+        """
+        Adds the nodes that the docstore holds for one source document.
+        """
+        ref_doc_info = docstore.get_ref_doc_info(ref_doc_id)
+        if ref_doc_info is None:
+            return
+        for node in docstore.get_nodes(ref_doc_info.node_ids):
+            self.add(node.node_id, node.get_content(metadata_mode=MetadataMode.NONE), ref_doc_id)
+
+    def remove_ref_doc(self, ref_doc_id: str) -> None:
+        self.remove_nodes([node_id for node_id, doc_id in self.ref_doc_ids.items() if doc_id == ref_doc_id])
+
+    def remove_nodes(self, node_ids: List[str]) -> None:
+        removed = set(node_ids).intersection(self.doc_lengths)
+        if not removed:
+            return
+        for term in list(self.postings):
+            postings = self.postings[term]
+            for node_id in removed.intersection(postings):
+                del postings[node_id]
+            if not postings:
+                del self.postings[term]
+        for node_id in removed:
+            self.total_length -= self.doc_lengths.pop(node_id)
+            self.ref_doc_ids.pop(node_id, None)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        Returns up to `top_k` (node id, BM25 score) pairs, best first.
+        """
+        node_count = len(self.doc_lengths)
+        if not node_count:
+            return []
+        average_length = self.total_length / node_count or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (node_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for node_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[node_id] / average_length)
+                scores[node_id] = scores.get(node_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+class HybridCourseRetriever(BaseRetriever):
+    """
+    Fuses vector and BM25 results of one course with reciprocal rank fusion.
+    """
+
+    def __init__(self, vector_retriever: BaseRetriever, lexical_index: BM25Index, docstore: BaseDocumentStore,
+                 top_k: int, lexical_top_k: int, rrf_k: int = 60):
+        self._vector_retriever = vector_retriever
+        self._lexical_index = lexical_index
+        self._docstore = docstore
+        self._top_k = top_k
+        self._lexical_top_k = lexical_top_k
+        self._rrf_k = rrf_k
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        lexical_hits = self._lexical_index.search(query_bundle.query_str, self._lexical_top_k)
+        return self._fuse(self._vector_retriever.retrieve(query_bundle), lexical_hits)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # The pure Python BM25 scan runs in a thread while the query is embedded.
+        lexical_search = asyncio.get_running_loop().run_in_executor(
+            None, self._lexical_index.search, query_bundle.query_str, self._lexical_top_k)
+        vector_nodes = await self._vector_retriever.aretrieve(query_bundle)
+        return self._fuse(vector_nodes, await lexical_search)
+
+    def _fuse(self, vector_nodes: List[NodeWithScore], lexical_hits: List[Tuple[str, float]]) -> List[NodeWithScore]:
+        nodes = {node.node.node_id: node.node for node in vector_nodes}
+        scores: Dict[str, float] = {}
+        for rank, node in enumerate(vector_nodes):
+            scores[node.node.node_id] = scores.get(node.node.node_id, 0.0) + 1.0 / (self._rrf_k + rank + 1)
+        for rank, (node_id, _) in enumerate(lexical_hits):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (self._rrf_k + rank + 1)
+
+        lexical_only = [node_id for node_id, _ in lexical_hits if node_id not in nodes]
+        if lexical_only:
+            try:
+                for node in self._docstore.get_nodes(lexical_only, raise_error=False):
+                    if node is not None:
+                        nodes[node.node_id] = node
+            except Exception as e:
+                logger.error(f"Failed to fetch lexical hits from docstore: {e}")
+
+        ranked = sorted((node_id for node_id in scores if node_id in nodes), key=scores.get, reverse=True)
+        return [NodeWithScore(node=nodes[node_id], score=scores[node_id]) for node_id in ranked[:self._top_k]]
@@ -0,0 +1,169 @@
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.utils import get_tokenizer
+
+from chatplatform.core.config import settings, logger
+from chatplatform.schemas.gpt_model import get_model_details
+
+DEFAULT_CONTEXT_WINDOW = 4096
+SHINGLE_WORDS = 5
+
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer()(text))
+
+
+def model_context_window(model: str) -> int:
+    for model_info in get_model_details():
+        if model_info.name == model:
+            return model_info.max_tokens
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def context_token_budget(model: str) -> int:
+    """
+    Tokens of retrieved context sent to `model` along with a question.
+    """
+    return min(settings.CONTEXT_MAX_TOKENS, int(model_context_window(model) * settings.CONTEXT_WINDOW_SHARE))
+
+
+def format_chunk(node: NodeWithScore) -> str:
+    file_name = node.node.metadata.get("file_name", "unknown")
+    return f"[{file_name}]\n{node.node.get_content(metadata_mode=MetadataMode.NONE)}"
+
+
+def shingles_of(text: str) -> FrozenSet[int]:
+    """
+    Hashes of the overlapping word 5-grams of `text`.
+    """
+    words = text.lower().split()
+    if not words:
+        return frozenset()
+    return frozenset(zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode())
+                     for i in range(max(len(words) - SHINGLE_WORDS + 1, 1)))
+
+
+def containment(part: FrozenSet[int], whole: FrozenSet[int]) -> float:
+    """
+    Share of the shingles of `part` that also occur in `whole`. Unlike Jaccard similarity, this recognizes
+    a chunk inside a larger merged one as well.
+    """
+    return len(part & whole) / len(part) if part else 0.0
+
+
+def _position(node: NodeWithScore) -> Optional[Tuple[str, int, int]]:
+    inner = node.node
+    if not isinstance(inner, TextNode) or inner.ref_doc_id is None \
+            or inner.start_char_idx is None or inner.end_char_idx is None:
+        return None
+    return inner.ref_doc_id, inner.start_char_idx, inner.end_char_idx
+
+
+def join_chunks(first: NodeWithScore, second: NodeWithScore) -> NodeWithScore:
+    """
+    Joins two overlapping or touching chunks of a document, `first` starting earlier, into one chunk
+    without repeating the text they share.
+    """
+    first_node, second_node = first.node, second.node
+    text = first_node.get_content(metadata_mode=MetadataMode.NONE)
+    second_text = second_node.get_content(metadata_mode=MetadataMode.NONE)
+    overlap = first_node.end_char_idx - second_node.start_char_idx
+    if second_node.end_char_idx > first_node.end_char_idx and overlap < len(second_text):
+        text = text + second_text[overlap:] if overlap >= 0 else f"{text} {second_text}"
+    joined = TextNode(
+        id_=first_node.node_id,
+        text=text,
+        metadata=dict(first_node.metadata),
+        excluded_embed_metadata_keys=list(first_node.excluded_embed_metadata_keys),
+        excluded_llm_metadata_keys=list(first_node.excluded_llm_metadata_keys),
+        relationships=dict(first_node.relationships),
+        start_char_idx=first_node.start_char_idx,
+        end_char_idx=max(first_node.end_char_idx, second_node.end_char_idx),
+    )
+    return NodeWithScore(node=joined, score=max(first.score or 0.0, second.score or 0.0))
+
+
+def merge_adjacent(nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+    """
+    Merges retrieved chunks that overlap or touch in their document, since the splitter's chunk overlap
+    would otherwise be sent twice. Returns the chunks by descending score.
+    """
+    merged = []
+    by_document: Dict[str, List[NodeWithScore]] = {}
+    for node in nodes:
+        position = _position(node)
+        if position is None:
+            merged.append(node)
+        else:
+            by_document.setdefault(position[0], []).append(node)
+
+    for chunks in by_document.values():
+        chunks.sort(key=lambda chunk: chunk.node.start_char_idx)
+        current = chunks[0]
+        for chunk in chunks[1:]:
+            if chunk.node.start_char_idx <= current.node.end_char_idx + 1:
+                current = join_chunks(current, chunk)
+            else:
+                merged.append(current)
+                current = chunk
+        merged.append(current)
+    return sorted(merged, key=lambda node: node.score or 0.0, reverse=True)
+
+
+def pack_nodes(nodes: List[NodeWithScore], token_budget: int) -> List[NodeWithScore]:
+    """
+    Selects the (reranked) chunks to send as context: adjacent chunks of a document are merged, chunks
+    mostly contained in a better scored one (e.g. the same file uploaded to two courses) are dropped, and
+    the rest fill `token_budget` by descending score. A chunk that does not fit is skipped, so a smaller
+    one further down may still be used.
+    """
+    total = sum(count_tokens(format_chunk(node)) for node in nodes)
+    candidates = merge_adjacent(nodes)
+    packed = []
+    kept_shingles = []
+    duplicates = 0
+    used = 0
+    for node in candidates:
+        text = format_chunk(node)
+        shingles = shingles_of(node.node.get_content(metadata_mode=MetadataMode.NONE))
+        if any(containment(shingles, kept) >= settings.CONTEXT_DEDUP_THRESHOLD for kept in kept_shingles):
+            duplicates += 1
+            continue
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            continue
+        packed.append(node)
+        used += tokens
+        kept_shingles.append(shingles)
+    logger.info(f"Packed {len(packed)} of {len(nodes)} retrieved chunks into {used} tokens, {total - used} of "
+                f"{total} tokens saved ({len(nodes) - len(candidates)} merged, {duplicates} near-duplicates)")
+    return packed
+
+
+def pack_context(nodes: List[NodeWithScore], token_budget: int) -> Tuple[str, List[NodeWithScore]]:
+    """
+    Packs chunks into a prompt context of at most `token_budget` tokens (see pack_nodes).
+    Returns the context text and the chunks it contains.
+    """
+    packed = pack_nodes(nodes, token_budget)
+    return "\n\n".join(format_chunk(node) for node in packed), packed
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """
+    Applies pack_nodes to the chunks a query engine synthesizes its answer from.
+    """
+
+    token_budget: int = Field(description="Tokens of context passed on.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        return pack_nodes(nodes, self.token_budget)
@@ -0,0 +1,132 @@
+import datetime
+from typing import List, Optional
+
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.llms import LLM
+
+from chatplatform.core.config import settings, logger
+from chatplatform.db.models.chat_session import ChatSession, ChatSessionMessage
+from chatplatform.services.context_packing_service import count_tokens, model_context_window
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation between a student and a course assistant below in at most {max_words} words. "
+    "Keep the facts, questions and answers that later questions may refer to.\n\n"
+    "{previous}{conversation}"
+)
+
+
+def history_token_budget(model: str) -> int:
+    return int(model_context_window(model) * settings.CHAT_HISTORY_CONTEXT_SHARE)
+
+
+def message_tokens(message: ChatMessage) -> int:
+    return count_tokens(message.content or "") + 4  # role and separators
+
+
+class ConversationMemory:
+    """
+    History of one chat session, kept in memory for the lifetime of the connection.
+
+    The most recent messages are kept verbatim as long as they fit `token_budget`; older ones are rolled
+    into a compact summary. Messages not yet written to the database are kept in `pending`.
+    """
+
+    def __init__(self, chat_session_id: int, token_budget: int, summary: Optional[str] = None):
+        self.chat_session_id = chat_session_id
+        self.token_budget = token_budget
+        self.summary = summary or ""
+        self.recent: List[ChatMessage] = []
+        self.pending: List[ChatSessionMessage] = []
+        self.summary_changed = False
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.recent or self.summary)
+
+    def messages(self) -> List[ChatMessage]:
+        """
+        Returns the history to send along with the next question.
+        """
+        history = []
+        if self.summary:
+            history.append(ChatMessage(role=MessageRole.SYSTEM,
+                                       content=f"Summary of the earlier conversation: {self.summary}"))
+        return history + self.recent
+
+    def add_turn(self, question: str, answer: str) -> None:
+        now = datetime.datetime.now()
+        for role, content in ((MessageRole.USER, question), (MessageRole.ASSISTANT, answer)):
+            self.recent.append(ChatMessage(role=role, content=content))
+            self.pending.append(ChatSessionMessage(chat_session_id=self.chat_session_id, role=role.value,
+                                                   content=content, created_at=now))
+
+    def take_overflow(self) -> List[ChatMessage]:
+        """
+        Removes and returns the oldest messages that do not fit the budget, always keeping the last turn.
+        """
+        tokens = count_tokens(self.summary) + sum(message_tokens(message) for message in self.recent)
+        overflow = []
+        while tokens > self.token_budget and len(self.recent) > 2:
+            message = self.recent.pop(0)
+            tokens -= message_tokens(message)
+            overflow.append(message)
+        return overflow
+
+    async def compact(self, llm: LLM) -> None:
+        """
+        Rolls the messages that exceed the budget into the summary with one completion.
+        """
+        overflow = self.take_overflow()
+        if not overflow:
+            return
+        conversation = "\n".join(f"{message.role.value}: {message.content}" for message in overflow)
+        previous = f"Summary so far: {self.summary}\n\n" if self.summary else ""
+        prompt = SUMMARY_PROMPT.format(max_words=settings.CHAT_SUMMARY_MAX_WORDS, previous=previous,
+                                       conversation=conversation)
+        try:
+            response = await llm.achat([ChatMessage(role=MessageRole.USER, content=prompt)])
+            self.summary = (response.message.content or "").strip()
+        except Exception as e:
+            # Keep the conversation going without the oldest turns rather than failing the answer.
+            logger.error(f"Failed to summarize chat session {self.chat_session_id}: {e}")
+        self.summary_changed = True
+
+
+class ConversationService:
+    def __init__(self, db):
+        self.db = db
+
+    def start(self, external_user_id: int, model: str) -> ConversationMemory:
+        chat_session = ChatSession(external_user_id=external_user_id, started_at=datetime.datetime.now(),
+                                   is_active=True)
+        self.db.add(chat_session)
+        self.db.commit()
+        return ConversationMemory(chat_session.id, history_token_budget(model))
+
+    def flush(self, memory: ConversationMemory) -> None:
+        """
+        Appends the pending messages (and a changed summary) in one transaction.
+        """
+        if not memory.pending and not memory.summary_changed:
+            return
+        try:
+            self.db.add_all(memory.pending)
+            if memory.summary_changed:
+                self.db.query(ChatSession).filter(ChatSession.id == memory.chat_session_id) \
+                    .update({ChatSession.summary: memory.summary})
+            self.db.commit()
+            memory.pending = []
+            memory.summary_changed = False
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to save chat session {memory.chat_session_id}: {e}")
+
+    def end(self, memory: ConversationMemory) -> None:
+        self.flush(memory)
+        try:
+            self.db.query(ChatSession).filter(ChatSession.id == memory.chat_session_id) \
+                .update({ChatSession.is_active: False, ChatSession.ended_at: datetime.datetime.now()})
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to close chat session {memory.chat_session_id}: {e}")
@@ -2,9 +2,12 @@ import os
 
 from sqlalchemy import func
 
+from chatplatform.core.config import logger
 from chatplatform.db.models.course import Course
 from chatplatform.db.models.document import Document
 from chatplatform.schemas.course import CourseCreate, CoursesGPTRequest, CourseGPTRequest
+from chatplatform.services.document_indexer_service import purge_course_task
+from chatplatform.services.indexing_job_service import IndexingJobService
 
 
 class CourseService:
@@ -35,7 +38,7 @@ class CourseService:
 
     def delete_course(self, course_id: int) -> bool:
         """
-        Deletes a course by its ID, including related documents.
+        Deletes a course by its ID, including related documents. Its index storage is purged by a background job.
         """
         # First, delete related documents
         documents = self.db.query(Document).filter(Document.course_id == course_id).all()
@@ -49,9 +52,23 @@ class CourseService:
         if db_course:
             self.db.delete(db_course)
             self.db.commit()
+            self.enqueue_purge(course_id, db_course.title.replace(" ", "_"))
             return True
         return False
 
+    def enqueue_purge(self, course_id: int, course_name: str):
+        """
+        Queues a background job that deletes the index storage of a deleted course and returns the job record.
+        """
+        job_service = IndexingJobService(self.db)
+        job = job_service.create_job(course_id=course_id)
+        try:
+            purge_course_task.delay(course_name, job.id)
+        except Exception as e:
+            logger.error(f"Failed to enqueue purge of course {course_id}: {e}")
+            job_service.mark_failed(job.id, f"Failed to enqueue: {e}")
+        return job
+
     async def get_course_id_by_name(self, course_name: str) -> int:
         course = self.db.query(Course).filter(Course.title == course_name).first()
         if course:
@@ -0,0 +1,50 @@
+from typing import AsyncGenerator, List, Optional
+
+from llama_index.core.base.llms.types import ChatMessage, ChatResponseAsyncGen, MessageRole
+from llama_index.core.llms import LLM
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+
+from chatplatform.services.context_packing_service import pack_context
+
+DIRECT_SYSTEM_PROMPT = (
+    "You are an assistant with access to course documents. Answer the question using the course document "
+    "excerpts below. If they do not contain the answer, say so. Please provide detailed, accurate, and "
+    "informative answers.\n\n"
+    "Course document excerpts:\n{context}"
+)
+NO_CONTEXT = "No matching excerpts were found."
+
+
+class DirectAnswer:
+    """
+    Streamed answer of a single chat completion over locally retrieved context. Offers the
+    `async_response_gen()`, `sources` and `source_nodes` interface of streaming agent responses.
+    """
+
+    def __init__(self, stream: ChatResponseAsyncGen, source_nodes: List[NodeWithScore]):
+        self._stream = stream
+        self.sources = []
+        self.source_nodes = source_nodes
+
+    async def async_response_gen(self) -> AsyncGenerator[str, None]:
+        async for chunk in self._stream:
+            if chunk.delta:
+                yield chunk.delta
+
+
+async def answer_directly(llm: LLM, retriever: BaseRetriever, question: str, context_tokens: int,
+                          chat_history: Optional[List[ChatMessage]] = None) -> DirectAnswer:
+    """
+    Retrieves and reranks course chunks locally, packs the best ones into the prompt within `context_tokens`
+    and answers with one streaming chat completion, instead of an agent deciding to call a search tool
+    and then answering from its output.
+    """
+    nodes = await retriever.aretrieve(question)
+    context, packed = pack_context(nodes, context_tokens)
+    messages = [
+        ChatMessage(role=MessageRole.SYSTEM, content=DIRECT_SYSTEM_PROMPT.format(context=context or NO_CONTEXT)),
+        *(chat_history or []),
+        ChatMessage(role=MessageRole.USER, content=question),
+    ]
+    return DirectAnswer(await llm.astream_chat(messages), packed)
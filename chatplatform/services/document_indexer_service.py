@@ -1,31 +1,146 @@
+import asyncio
 import os
+import shutil
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, NamedTuple, Optional
 
 from celery import Celery, shared_task
-from llama_index.core import Settings, ServiceContext, StorageContext, load_index_from_storage, SimpleDirectoryReader, \
-    VectorStoreIndex, PromptHelper
+from filelock import FileLock, Timeout
+from llama_index.core import Settings, ServiceContext, StorageContext, load_index_from_storage, VectorStoreIndex, \
+    PromptHelper
+from llama_index.core import Document as LlamaDocument
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.postprocessor import SentenceTransformerRerank
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.llms import LLM
 from llama_index.core.tools import QueryEngineTool, ToolMetadata
-from llama_index.llms.openai import OpenAI
+from llama_index.core.vector_stores.simple import DEFAULT_VECTOR_STORE
+from llama_index.embeddings.openai import OpenAIEmbedding
 
 from chatplatform.core.config import settings, logger
+from chatplatform.db.models.course import Course
 from chatplatform.db.models.document import Document
+from chatplatform.db.session import SessionLocal
+from chatplatform.services.bm25_service import BM25Index, HybridCourseRetriever
+from chatplatform.services.document_parser_service import DocumentParserService
+from chatplatform.services.embedding_cache_service import CachedEmbedding, EmbeddingCacheStore
+from chatplatform.services.federated_retriever_service import FederatedCourseRetriever
+from chatplatform.services.index_cache_service import index_cache, directory_size
+from chatplatform.services.index_snapshot_service import IndexSnapshotStore
+from chatplatform.services.context_packing_service import ContextPacker, context_token_budget
+from chatplatform.services.indexing_job_service import IndexingJobService
+from chatplatform.services.llm_client_service import llm_client
+from chatplatform.services.numpy_vector_store import NumpyVectorStore
+from chatplatform.services.reranker_service import reranker_service
 
 os.environ["OPENAI_API_KEY"] = settings.OPENAPI_KEY
-Settings.llm = OpenAI(temperature=0.7, model="gpt-4-turbo-preview")
+Settings.llm = llm_client(settings.DEFAULT_CHAT_MODEL, settings.DEFAULT_TEMPERATURE)
+Settings.embed_model = CachedEmbedding(
+    inner=OpenAIEmbedding(embed_batch_size=settings.EMBEDDING_BATCH_SIZE, api_base=settings.OPENAI_API_BASE),
+    store=EmbeddingCacheStore(settings.EMBEDDING_CACHE_PATH),
+    embed_batch_size=settings.EMBEDDING_BATCH_SIZE,
+)
 app = Celery('tasks', broker=settings.CELERY_BROKER_URL)
+# Eager mode runs tasks in the calling process, which together with the "memory://" broker
+# allows exercising the indexing pipeline without a real broker.
+app.conf.task_always_eager = settings.CELERY_TASK_ALWAYS_EAGER
 
 
-@shared_task
-def index_document_task(document_id, db):
-    document = db.query(Document).get(document_id)
-    if document:
+def course_name_for(doc: Document) -> str:
+    """
+    Returns the course directory name of a document, taken from its storage path.
+    """
+    return Path(doc.filepath).parts[-2]
+
+
+def ref_doc_id_for(doc: Document) -> str:
+    """
+    Returns the llama-index ref-doc id under which a document's nodes are stored.
+    """
+    return doc.doc_id or f"document-{doc.id}"
+
+
+@shared_task(name="chatplatform.index_document")
+def index_document_task(document_id: int, job_id: int) -> None:
+    """
+    Indexes a single document in a worker. The task opens its own database session and
+    serializes on the course so that two jobs never write the same persist dir at once.
+    """
+    db = SessionLocal()
+    job_service = IndexingJobService(db)
+    try:
+        document = db.query(Document).get(document_id)
+        if not document:
+            logger.error(f"Document with ID {document_id} not found.")
+            job_service.mark_failed(job_id, f"Document with ID {document_id} not found.")
+            return
+        indexer = DocumentIndexer(db)
+        with indexer.course_lock(course_name_for(document)):
+            # The course may have been deleted, and its storage purged, while the job was queued.
+            if not indexer.course_exists(document.course_id):
+                logger.info(f"Course {document.course_id} was deleted, not indexing document {document_id}")
+                job_service.mark_failed(job_id, f"Course {document.course_id} was deleted.")
+                return
+            job_service.mark_running(job_id)
+            indexer.index_document(document)
+        job_service.mark_done(job_id)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Indexing job {job_id} for document {document_id} failed: {e}")
+        job_service.mark_failed(job_id, str(e))
+        raise
+    finally:
+        db.close()
+
+
+@shared_task(name="chatplatform.remove_document")
+def remove_document_task(course_name: str, ref_doc_id: str, job_id: int) -> None:
+    """
+    Drops the nodes of a deleted document from its course index.
+    """
+    db = SessionLocal()
+    job_service = IndexingJobService(db)
+    try:
+        indexer = DocumentIndexer(db)
+        with indexer.course_lock(course_name):
+            job_service.mark_running(job_id)
+            # Nodes of a deleted course go with its storage, which the purge job removes.
+            if indexer.course_exists(job_service.get_job(job_id).course_id):
+                indexer.remove_document(course_name, ref_doc_id)
+        job_service.mark_done(job_id)
+    except Exception as e:
+        logger.error(f"Removing {ref_doc_id} from index of {course_name} failed: {e}")
+        job_service.mark_failed(job_id, str(e))
+        raise
+    finally:
+        db.close()
+
+
+@shared_task(name="chatplatform.purge_course")
+def purge_course_task(course_name: str, job_id: int) -> None:
+    """
+    Deletes the index storage of a deleted course once the jobs writing to it have finished.
+    """
+    db = SessionLocal()
+    job_service = IndexingJobService(db)
+    try:
         indexer = DocumentIndexer(db)
-        indexer.index_document(document)
-    else:
-        logger.error(f"Document with ID {document_id} not found.")
+        with indexer.course_lock(course_name):
+            job_service.mark_running(job_id)
+            indexer.purge_course(course_name)
+        job_service.mark_done(job_id)
+        indexer.collect_garbage()
+    except Exception as e:
+        logger.error(f"Purging index storage of {course_name} failed: {e}")
+        job_service.mark_failed(job_id, str(e))
+        raise
+    finally:
+        db.close()
+
+
+class LoadedCourseIndex(NamedTuple):
+    index: VectorStoreIndex
+    lexical_index: Optional[BM25Index]
 
 
 class DocumentIndexer:
@@ -33,48 +148,240 @@ class DocumentIndexer:
         self.db = db_session
         self.storage_path = Path(os.getenv("STORAGE_PATH", "./storage"))
         self.prompt_helper = PromptHelper(4096, 256, 0.5)
-        self.service_context = ServiceContext.from_defaults(chunk_size=1000, prompt_helper=self.prompt_helper)
-        self.query_engine_tools: Dict[str, QueryEngineTool] = {}
+        self.service_context = ServiceContext.from_defaults(chunk_size=1000, prompt_helper=self.prompt_helper,
+                                                            embed_model=Settings.embed_model)
+        self.splitter = SentenceSplitter(chunk_size=256)
+        self.snapshots = IndexSnapshotStore(self.storage_path, settings.INDEX_SNAPSHOT_GRACE_SECONDS)
 
     def index_document(self, doc: Document) -> None:
+        """
+        Parses, chunks and embeds a single document and inserts its nodes into the existing course index.
+        The resulting ref-doc id is stored in `Document.doc_id`.
+        """
         logger.info(f"Starting to index document: {doc.filename}")
 
-        # Extract course_name from the document's current system path
-        document_path = Path(doc.filepath)
-        course_name = document_path.parts[-2]  # Assuming course_name is the second last part of the path
-
-        doc_storage_path = self.storage_path / course_name / "files"
-        doc_storage_path.mkdir(parents=True, exist_ok=True)
-
+        course_name = course_name_for(doc)
         try:
-            storage_context = StorageContext.from_defaults(persist_dir=str(doc_storage_path))
-            index = load_index_from_storage(storage_context)
-            document = SimpleDirectoryReader(document_path.parent).load_data()
-            index.refresh_ref_docs(document, update_kwargs={"delete_kwargs": {"delete_from_docstore": True}})
+            index, lexical_index = self.load_index_for_update(course_name)
         except Exception as e:
             logger.error(f"Failed to load index for {course_name}, creating a new one: {e}")
-            document = SimpleDirectoryReader(document_path.parent).load_data()
-            splitter = SentenceSplitter(chunk_size=256)
-            index = VectorStoreIndex.from_documents(document, service_context=self.service_context,
-                                                    transformations=[splitter])
-            index.storage_context.persist(str(doc_storage_path))
-
-    async def ensure_tool_for_course(self, course_name: str) -> Optional[QueryEngineTool]:
-        if course_name not in self.query_engine_tools:
-            doc_storage_path = self.storage_path / course_name / "files"
+            self.build_course_index(doc.course_id, course_name)
+        else:
+            if doc.doc_id:
+                # Re-indexing the same document replaces its previous nodes.
+                index.delete_ref_doc(doc.doc_id, delete_from_docstore=True)
+                lexical_index.remove_ref_doc(doc.doc_id)
+            llama_document = self.read_document(doc)
+            index.insert(llama_document)
+            lexical_index.add_ref_doc(index.docstore, llama_document.doc_id)
+            self.publish_index(course_name, index, lexical_index)
+            doc.doc_id = llama_document.doc_id
+        self.db.commit()
+        index_cache.invalidate(course_name)
+
+    def build_course_index(self, course_id: int, course_name: str) -> VectorStoreIndex:
+        """
+        Builds a fresh index from every document of a course and publishes it. Documents are parsed in
+        parallel and chunked and embedded as soon as each one has been parsed.
+        """
+        documents = self.db.query(Document).filter(Document.course_id == course_id).all()
+        index = VectorStoreIndex(nodes=[], storage_context=self.new_storage_context(),
+                                 service_context=self.service_context, transformations=[self.splitter])
+        for document, text in DocumentParserService(self.db).iter_texts(documents):
+            if text is None:
+                logger.error(f"Skipping document {document.filename} in rebuild of course {course_id}")
+                continue
+            llama_document = self.to_llama_document(document, text)
+            index.insert(llama_document)
+            document.doc_id = llama_document.doc_id
+        self.publish_index(course_name, index, BM25Index.from_docstore(index.docstore))
+        return index
+
+    def remove_document(self, course_name: str, ref_doc_id: str) -> None:
+        """
+        Deletes the nodes of one document from the docstore and vector store of a course index.
+        """
+        if self.snapshots.current_path(course_name) is None:
+            logger.info(f"No index stored for {course_name}, nothing to remove")
+            return
+        index, lexical_index = self.load_index_for_update(course_name)
+        index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        lexical_index.remove_ref_doc(ref_doc_id)
+        self.publish_index(course_name, index, lexical_index)
+        index_cache.invalidate(course_name)
+        logger.info(f"Removed {ref_doc_id} from index of {course_name}")
+
+    def load_index_for_update(self, course_name: str) -> LoadedCourseIndex:
+        """
+        Loads a private copy of the live course index and its lexical index for modification.
+        Callers must hold the course lock.
+        """
+        current_path = self.snapshots.current_path(course_name)
+        if current_path is None:
+            raise FileNotFoundError(f"No index stored for {course_name}")
+        storage_context = self.storage_context_for(current_path)
+        index = load_index_from_storage(storage_context, transformations=[self.splitter])
+        # Snapshots persisted before lexical indexing get one built from their docstore.
+        lexical_index = BM25Index.load(current_path) or BM25Index.from_docstore(index.docstore)
+        return LoadedCourseIndex(index, lexical_index)
+
+    def publish_index(self, course_name: str, index: VectorStoreIndex, lexical_index: BM25Index) -> None:
+        """
+        Persists the index and its lexical index as a new snapshot version and atomically makes it the live one.
+        """
+        version_path = self.snapshots.new_version_path(course_name)
+        index.storage_context.persist(str(version_path))
+        lexical_index.persist(version_path)
+        self.snapshots.publish(course_name, version_path)
+
+    def purge_course(self, course_name: str) -> None:
+        """
+        Deletes the whole storage directory of a course. Callers must hold the course lock.
+        """
+        shutil.rmtree(self.storage_path / course_name, ignore_errors=True)
+        index_cache.invalidate(course_name)
+        logger.info(f"Purged index storage of {course_name}")
+
+    def collect_garbage(self) -> None:
+        """
+        Deletes the expired index versions of every course. Versions are otherwise only collected when their
+        course publishes again, which a course that stopped changing never does. Courses whose lock is held
+        are skipped; the build holding it collects when it publishes.
+        """
+        if not self.storage_path.exists():
+            return
+        for course_dir in sorted(path for path in self.storage_path.iterdir() if path.is_dir()):
+            try:
+                with self.course_lock(course_dir.name).acquire(timeout=0):
+                    self.snapshots.collect_garbage(course_dir.name)
+            except Timeout:
+                continue
+            except Exception as e:
+                logger.error(f"Failed to collect old index versions of {course_dir.name}: {e}")
+
+    def read_document(self, doc: Document) -> LlamaDocument:
+        """
+        Returns the text of a single uploaded file as one llama-index document, identified by a ref-doc id
+        derived from the database id. The text is read from the database cache when it is current.
+        """
+        return self.to_llama_document(doc, DocumentParserService(self.db).get_text(doc))
+
+    @staticmethod
+    def to_llama_document(doc: Document, text: str) -> LlamaDocument:
+        return LlamaDocument(
+            id_=ref_doc_id_for(doc),
+            text=text,
+            metadata={"file_name": doc.filename, "document_id": doc.id, "course_id": doc.course_id},
+            # Keep ids out of the embedded text so identical chunks share embedding cache entries.
+            excluded_embed_metadata_keys=["document_id", "course_id"],
+            excluded_llm_metadata_keys=["document_id", "course_id"],
+        )
+
+    def storage_context_for(self, persist_dir: Path) -> StorageContext:
+        """
+        Returns the storage context of a persisted course index. Indexes persisted with the JSON vector
+        store are converted in memory when the numpy backend is configured, and saved in the new format
+        on their next persist.
+        """
+        if NumpyVectorStore.exists(persist_dir):
+            numpy_store = NumpyVectorStore.from_persist_dir(persist_dir, quantization=settings.VECTOR_QUANTIZATION)
+            return StorageContext.from_defaults(persist_dir=str(persist_dir), vector_store=numpy_store)
+        storage_context = StorageContext.from_defaults(persist_dir=str(persist_dir))
+        if settings.VECTOR_STORE_BACKEND == "numpy":
+            numpy_store = NumpyVectorStore.from_simple_vector_store(storage_context.vector_store,
+                                                                    quantization=settings.VECTOR_QUANTIZATION)
+            storage_context.add_vector_store(numpy_store, DEFAULT_VECTOR_STORE)
+        return storage_context
+
+    def new_storage_context(self) -> StorageContext:
+        if settings.VECTOR_STORE_BACKEND == "numpy":
+            return StorageContext.from_defaults(
+                vector_store=NumpyVectorStore(quantization=settings.VECTOR_QUANTIZATION))
+        return StorageContext.from_defaults()
+
+    def course_lock(self, course_name: str) -> FileLock:
+        """
+        Returns an inter-process lock guarding writes to the storage of a course.
+        """
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+        return FileLock(str(self.storage_path / f"{course_name}.lock"))
+
+    def course_exists(self, course_id: int) -> bool:
+        return self.db.query(Course.id).filter(Course.id == course_id).first() is not None
+
+    def course_versions(self, course_names: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Returns the live index version of every course, None for courses without an index.
+        """
+        return {course_name: self.snapshots.current_version(course_name) for course_name in course_names}
+
+    def load_course_index(self, course_name: str) -> LoadedCourseIndex:
+        """
+        Returns the live course index from the process-wide cache, loading it from storage on a miss.
+        """
+        version = self.snapshots.current_version(course_name)
+        if version is None:
+            raise FileNotFoundError(f"No index stored for {course_name}")
+        snapshot_path = self.snapshots.path_for(course_name, version)
+
+        def load():
+            storage_context = self.storage_context_for(snapshot_path)
+            loaded = LoadedCourseIndex(load_index_from_storage(storage_context), BM25Index.load(snapshot_path))
+            return loaded, directory_size(snapshot_path)
+
+        return index_cache.get_or_load(course_name, load, version=version)
+
+    @staticmethod
+    def course_retriever(loaded: LoadedCourseIndex) -> BaseRetriever:
+        """
+        Returns the retriever of one course: vector search fused with BM25 when a lexical index exists.
+        """
+        vector_retriever = loaded.index.as_retriever(similarity_top_k=settings.RETRIEVAL_TOP_K)
+        if loaded.lexical_index is None or not settings.HYBRID_RETRIEVAL_ENABLED:
+            return vector_retriever
+        return HybridCourseRetriever(vector_retriever, loaded.lexical_index, loaded.index.docstore,
+                                     top_k=settings.RETRIEVAL_TOP_K, lexical_top_k=settings.LEXICAL_TOP_K,
+                                     rrf_k=settings.RRF_K)
+
+    def federated_retriever(self, course_names: List[str]) -> Optional[FederatedCourseRetriever]:
+        """
+        Returns a retriever that searches all given courses concurrently and reranks their merged results.
+        """
+        retrievers = {}
+        for course_name in course_names:
             try:
-                storage_context = StorageContext.from_defaults(persist_dir=str(doc_storage_path))
-                index = load_index_from_storage(storage_context)
+                loaded = self.load_course_index(course_name)
             except Exception as e:
                 logger.error(f"Error loading or creating index for {course_name}: {e}")
-                return None
-            rerank = SentenceTransformerRerank(
-                model="cross-encoder/ms-marco-MiniLM-L-2-v2", top_n=10
-            )
-            query_engine = index.as_query_engine(similarity_top_k=10, node_postprocessors=[rerank])
-            tool = QueryEngineTool(
-                query_engine=query_engine,
-                metadata=ToolMetadata(name=course_name, description=f"Assistance based on {course_name} documents.")
+                continue
+            retrievers[course_name] = self.course_retriever(loaded)
+        if not retrievers:
+            return None
+        return FederatedCourseRetriever(retrievers, reranker_service.get(),
+                                        max_concurrency=settings.FEDERATED_MAX_CONCURRENCY,
+                                        rerank_executor=reranker_service.executor)
+
+    async def afederated_retriever(self, course_names: List[str]) -> Optional[FederatedCourseRetriever]:
+        """
+        Builds the federated retriever in a thread, as cache misses load indexes (and the reranker) from disk.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.federated_retriever, course_names)
+
+    async def ensure_federated_tool(self, course_names: List[str], llm: Optional[LLM] = None) \
+            -> Optional[QueryEngineTool]:
+        """
+        Returns a single tool that searches all given courses concurrently and reranks their merged results,
+        synthesizing its output with `llm` (the global default if not given) from context packed for its model.
+        """
+        retriever = await self.afederated_retriever(course_names)
+        if retriever is None:
+            return None
+        llm = llm or Settings.llm
+        packer = ContextPacker(token_budget=context_token_budget(llm.model))
+        return QueryEngineTool(
+            query_engine=RetrieverQueryEngine.from_args(retriever, llm=llm, node_postprocessors=[packer]),
+            metadata=ToolMetadata(
+                name="course_documents",
+                description=f"Assistance based on the documents of the courses: {', '.join(retriever.course_names)}."
             )
-            self.query_engine_tools[course_name] = tool
-        return self.query_engine_tools.get(course_name)
+        )
@@ -0,0 +1,187 @@
+import datetime
+import json
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from llama_index.core import SimpleDirectoryReader
+
+from chatplatform.core.config import settings, logger
+from chatplatform.db.models.document import Document
+
+# Bump when extraction changes so cached document text is parsed again.
+PARSER_VERSION = "1"
+# Extra time a worker gets after its SIGALRM before the process is killed.
+PARSER_KILL_GRACE_SECONDS = 5.0
+
+
+def parse_file(filepath: str) -> Tuple[str, dict]:
+    """
+    Extracts the text of a PDF/DOCX/JSON/XML file.
+
+    :return: Tuple of the extracted text and metadata describing the extraction.
+    """
+    pages = SimpleDirectoryReader(input_files=[filepath]).load_data()
+    # PostgreSQL text columns cannot hold NUL characters, which some PDF extractors emit.
+    text = "\n\n".join(page.text for page in pages).replace("\x00", "")
+    metadata = {
+        "parser_version": PARSER_VERSION,
+        "pages": len(pages),
+        "characters": len(text),
+        "extracted_at": datetime.datetime.now().isoformat(),
+    }
+    return text, metadata
+
+
+def parse_file_with_timeout(filepath: str, timeout: float) -> Tuple[str, dict]:
+    """
+    Runs `parse_file` in a pool worker and aborts it with SIGALRM after `timeout` seconds,
+    so one malformed file cannot occupy a worker forever.
+    """
+    def on_timeout(signum, frame):
+        raise TimeoutError(f"Parsing {filepath} exceeded {timeout}s")
+
+    previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return parse_file(filepath)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+class ParserPool:
+    """
+    Worker processes shared by all parses of this process, started on first use. Workers are spawned
+    rather than forked, since the indexing worker runs threads that may hold locks at fork time. A pool
+    whose workers hang is terminated, killing them, and replaced on the next use.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, filepaths: List[str], timeout: float) -> "queue.Queue":
+        """
+        Starts parsing `filepaths` and returns the queue receiving (index, result, error) triples as parses finish.
+        """
+        results: "queue.Queue" = queue.Queue()
+        with self._lock:
+            if self._pool is None:
+                workers = settings.PARSER_WORKERS or os.cpu_count() or 1
+                self._pool = multiprocessing.get_context("spawn").Pool(processes=workers)
+                # Spawned workers import the app first; that must not count against the parse deadlines.
+                self._pool.apply(os.getpid)
+            for index, filepath in enumerate(filepaths):
+                self._pool.apply_async(
+                    parse_file_with_timeout, (filepath, timeout),
+                    callback=lambda result, index=index: results.put((index, result, None)),
+                    error_callback=lambda error, index=index: results.put((index, None, error)))
+        return results
+
+    def terminate(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+
+parser_pool = ParserPool()
+
+
+def parse_files(filepaths: List[str], timeout: float) -> Iterator[Tuple[int, Optional[Tuple[str, dict]],
+                                                                         Optional[BaseException]]]:
+    """
+    Parses files on the shared parser pool, yielding (index, result, error) as each finishes.
+
+    Every parse is aborted by SIGALRM after `timeout` seconds. As a backstop for parsers stuck in native code,
+    the batch may wait on the pool for `timeout` per round of workers plus a grace period; the time the
+    consumer spends between items does not count. When that is used up, the hung workers are killed and the
+    unfinished files are yielded with a TimeoutError.
+    """
+    results = parser_pool.submit(filepaths, timeout)
+    workers = settings.PARSER_WORKERS or os.cpu_count() or 1
+    remaining = timeout * math.ceil(len(filepaths) / workers) + PARSER_KILL_GRACE_SECONDS
+    unfinished = set(range(len(filepaths)))
+    while unfinished:
+        started = time.monotonic()
+        try:
+            index, result, error = results.get(timeout=max(remaining, 0))
+        except queue.Empty:
+            logger.error("Parsing exceeded its deadline, killing the parser workers")
+            parser_pool.terminate()
+            for index in sorted(unfinished):
+                yield index, None, TimeoutError(f"Parsing {filepaths[index]} exceeded {timeout}s")
+            return
+        remaining -= time.monotonic() - started
+        unfinished.discard(index)
+        yield index, result, error
+
+
+def cached_metadata(doc: Document) -> Optional[dict]:
+    """
+    Returns the extraction metadata of a document if its cached text is current, otherwise None.
+    """
+    if doc.document_content is None or not doc.document_metadata:
+        return None
+    try:
+        metadata = json.loads(doc.document_metadata)
+    except ValueError:
+        return None
+    return metadata if metadata.get("parser_version") == PARSER_VERSION else None
+
+
+class DocumentParserService:
+    """
+    Extracts document text once and caches it in `Document.document_content`, so index builds,
+    rebuilds and re-chunking don't parse the binary file again.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def get_text(self, doc: Document) -> str:
+        if cached_metadata(doc) is not None:
+            return doc.document_content
+        logger.info(f"Extracting text of document {doc.filename}")
+        _, result, error = next(parse_files([doc.filepath], settings.PARSER_FILE_TIMEOUT))
+        if error is not None:
+            raise error
+        text, metadata = result
+        self.store(doc, text, metadata)
+        return text
+
+    def iter_texts(self, docs: List[Document]) -> Iterator[Tuple[Document, Optional[str]]]:
+        """
+        Yields (document, text) pairs as soon as each document is available. Cached texts come first,
+        the rest is parsed on the shared pool of PARSER_WORKERS processes. Text is None for files that
+        failed or timed out.
+        """
+        pending = []
+        for doc in docs:
+            if cached_metadata(doc) is not None:
+                yield doc, doc.document_content
+            else:
+                pending.append(doc)
+        if not pending:
+            return
+
+        for index, result, error in parse_files([doc.filepath for doc in pending], settings.PARSER_FILE_TIMEOUT):
+            doc = pending[index]
+            if error is not None:
+                logger.error(f"Failed to parse {doc.filename}: {error}")
+                yield doc, None
+                continue
+            text, metadata = result
+            self.store(doc, text, metadata)
+            yield doc, text
+
+    def store(self, doc: Document, text: str, metadata: dict) -> None:
+        doc.document_content = text
+        doc.document_metadata = json.dumps(metadata)
+        self.db.commit()
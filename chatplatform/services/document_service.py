@@ -9,8 +9,11 @@ from sqlalchemy import func
 from chatplatform.core.config import logger
 from chatplatform.db.models.document import Document
 from chatplatform.schemas.document import DocumentOut, DocumentsResponse
+from chatplatform.services.answer_cache_service import answer_cache
 from chatplatform.services.course_service import CourseService
-from chatplatform.services.document_indexer_service import index_document_task
+from chatplatform.services.document_indexer_service import index_document_task, remove_document_task, \
+    course_name_for, ref_doc_id_for
+from chatplatform.services.indexing_job_service import IndexingJobService
 
 
 def save_document_file(file, file_path: str):
@@ -45,9 +48,23 @@ class DocumentService:
         self.db.add(db_document)
         self.db.commit()
         self.db.refresh(db_document)
-        index_document_task(db_document.id, self.db)
+        self.enqueue_indexing(db_document)
+        answer_cache.invalidate_course(course_name_for(db_document))
         return db_document
 
+    def enqueue_indexing(self, db_document: Document):
+        """
+        Queues a background job that indexes the document and returns the job record.
+        """
+        job_service = IndexingJobService(self.db)
+        job = job_service.create_job(course_id=db_document.course_id, document_id=db_document.id)
+        try:
+            index_document_task.delay(db_document.id, job.id)
+        except Exception as e:
+            logger.error(f"Failed to enqueue indexing of document {db_document.id}: {e}")
+            job_service.mark_failed(job.id, f"Failed to enqueue: {e}")
+        return job
+
     def upload_document(self, file: UploadFile, course_id: int) -> Document:
         """
          Handles the uploading and saving of a document under a directory named after the course,
@@ -95,12 +112,29 @@ class DocumentService:
         if db_document:
             if os.path.exists(db_document.filepath):
                 os.remove(db_document.filepath)
-                self.db.delete(db_document)
-                self.db.commit()
-                index_document_task(db_document.id, self.db)
-                return True
+            course_id = db_document.course_id
+            course_name = course_name_for(db_document)
+            ref_doc_id = ref_doc_id_for(db_document)
+            self.db.delete(db_document)
+            self.db.commit()
+            self.enqueue_removal(course_id, document_id, course_name, ref_doc_id)
+            answer_cache.invalidate_course(course_name)
+            return True
         return False
 
+    def enqueue_removal(self, course_id: int, document_id: int, course_name: str, ref_doc_id: str):
+        """
+        Queues a background job that drops a deleted document's nodes from the course index.
+        """
+        job_service = IndexingJobService(self.db)
+        job = job_service.create_job(course_id=course_id, document_id=document_id)
+        try:
+            remove_document_task.delay(course_name, ref_doc_id, job.id)
+        except Exception as e:
+            logger.error(f"Failed to enqueue removal of document {document_id}: {e}")
+            job_service.mark_failed(job.id, f"Failed to enqueue: {e}")
+        return job
+
     def get_all_documents_response(self) -> DocumentsResponse:
         documents = self.db.query(Document).all()
         document_out_list = [DocumentOut(
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from chatplatform.core.config import logger
+
+# Query embeddings kept in memory, so the answer cache lookup and every course search share one request.
+QUERY_CACHE_SIZE = 1024
+
+
+class EmbeddingCacheStore:
+    """
+    On-disk embedding cache keyed by (embedding model, sha256 of the chunk text), backed by SQLite so that
+    web and indexing worker processes can share it. The database is opened on first use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # Callers hold self._lock.
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            connection.commit()
+            self._db = connection
+        return self._db
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return f"{model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()])
+            self._connection.commit()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Embedding model wrapper that only sends chunks to the wrapped model when their text has not been
+    embedded before. Cache misses are embedded in large batches. Recent query embeddings are kept in memory.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingCacheStore = PrivateAttr()
+    _stats_lock: threading.Lock = PrivateAttr()
+    _hits: int = PrivateAttr()
+    _misses: int = PrivateAttr()
+    _embed_seconds: float = PrivateAttr()
+    _query_cache: OrderedDict = PrivateAttr()
+    _query_hits: int = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, store: EmbeddingCacheStore, embed_batch_size: int = 512,
+                 **kwargs: Any):
+        super().__init__(model_name=inner.model_name, embed_batch_size=embed_batch_size, **kwargs)
+        self._inner = inner
+        self._store = store
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._embed_seconds = 0.0
+        self._query_cache = OrderedDict()
+        self._query_hits = 0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        embedding = self._cached_query_embedding(query)
+        if embedding is None:
+            embedding = self._inner.get_query_embedding(query)
+            self._remember_query_embedding(query, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        embedding = self._cached_query_embedding(query)
+        if embedding is None:
+            embedding = await self._inner.aget_query_embedding(query)
+            self._remember_query_embedding(query, embedding)
+        return embedding
+
+    def _cached_query_embedding(self, query: str) -> Optional[List[float]]:
+        with self._stats_lock:
+            embedding = self._query_cache.get(query)
+            if embedding is not None:
+                self._query_cache.move_to_end(query)
+                self._query_hits += 1
+            return embedding
+
+    def _remember_query_embedding(self, query: str, embedding: List[float]) -> None:
+        with self._stats_lock:
+            self._query_cache[query] = embedding
+            while len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # SQLite lookups run in a thread and misses go to the wrapped model's async API, off the event loop.
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts)
+        elapsed = 0.0
+        if missing:
+            started = time.perf_counter()
+            vectors = await self._inner.aget_text_embedding_batch(list(missing.values()))
+            elapsed = time.perf_counter() - started
+            embedded = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self._store.put_many, embedded)
+            cached.update(embedded)
+        return self._collect(texts, keys, cached, missing, elapsed)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._lookup(texts)
+        elapsed = 0.0
+        if missing:
+            started = time.perf_counter()
+            vectors = self._inner.get_text_embedding_batch(list(missing.values()))
+            elapsed = time.perf_counter() - started
+            embedded = dict(zip(missing.keys(), vectors))
+            self._store.put_many(embedded)
+            cached.update(embedded)
+        return self._collect(texts, keys, cached, missing, elapsed)
+
+    def _lookup(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+        """
+        Returns the cache keys of `texts`, the cached embeddings and the texts still to embed by key.
+        """
+        keys = [EmbeddingCacheStore.key(self.model_name, text) for text in texts]
+        cached = self._store.get_many(list(set(keys)))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        return keys, cached, missing
+
+    def _collect(self, texts: List[str], keys: List[str], cached: Dict[str, List[float]], missing: Dict[str, str],
+                 elapsed: float) -> List[List[float]]:
+        with self._stats_lock:
+            self._hits += len(texts) - len(missing)
+            self._misses += len(missing)
+            self._embed_seconds += elapsed
+        if missing:
+            logger.info(f"Embedded {len(missing)} of {len(texts)} chunks "
+                        f"({len(missing) / elapsed if elapsed else 0.0:.1f} chunks/s), rest from cache")
+        return [cached[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                "model": self.model_name,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "embed_seconds": self._embed_seconds,
+                "chunks_per_second": self._misses / self._embed_seconds if self._embed_seconds else None,
+                "query_hits": self._query_hits,
+            }
+
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Optional
+
+from chatplatform.core.config import settings, logger
+from chatplatform.services.latency_metrics import LatencyWindow
+
+
+class EventLoopMonitor:
+    """
+    Measures event loop lag: how much later than requested a periodic sleep wakes up. Lag means some
+    callback blocked the loop, and every WebSocket and HTTP request of the worker waited for it.
+    """
+
+    def __init__(self, interval: float, threshold_ms: int):
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self.lag = LatencyWindow()
+        self.blocked = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.threshold_ms > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self.lag.record(lag)
+            if lag * 1000 >= self.threshold_ms:
+                self.blocked += 1
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+    def stats(self) -> dict:
+        return {"running": self._task is not None, "blocked": self.blocked, "lag": self.lag.stats()}
+
+
+event_loop_monitor = EventLoopMonitor(settings.EVENT_LOOP_LAG_INTERVAL, settings.EVENT_LOOP_LAG_THRESHOLD_MS)
@@ -0,0 +1,78 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from chatplatform.core.config import logger
+
+
+def merge_candidates(results: List[List[NodeWithScore]]) -> List[NodeWithScore]:
+    """
+    Merges per-course candidate lists, keeping the best scored copy of every node.
+    """
+    merged: Dict[str, NodeWithScore] = {}
+    for nodes in results:
+        for node in nodes:
+            current = merged.get(node.node.node_id)
+            if current is None or (node.score or 0.0) > (current.score or 0.0):
+                merged[node.node.node_id] = node
+    return sorted(merged.values(), key=lambda node: node.score or 0.0, reverse=True)
+
+
+class FederatedCourseRetriever(BaseRetriever):
+    """
+    Searches several course indexes concurrently (with bounded concurrency), merges their candidates
+    and reranks the merged list once, so latency follows the slowest course instead of the sum.
+    In async retrieval the rerank runs on `rerank_executor` (the default executor if not given).
+    """
+
+    def __init__(self, retrievers: Dict[str, BaseRetriever], reranker: BaseNodePostprocessor,
+                 max_concurrency: int = 8, rerank_executor: Optional[Executor] = None):
+        self._retrievers = retrievers
+        self._reranker = reranker
+        self._max_concurrency = max_concurrency
+        self._rerank_executor = rerank_executor
+        super().__init__()
+
+    @property
+    def course_names(self) -> List[str]:
+        return list(self._retrievers)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        def search(course_name: str, retriever: BaseRetriever) -> List[NodeWithScore]:
+            try:
+                return retriever.retrieve(query_bundle)
+            except Exception as e:
+                logger.error(f"Retrieval from {course_name} failed: {e}")
+                return []
+
+        if len(self._retrievers) <= 1:
+            results = [search(name, retriever) for name, retriever in self._retrievers.items()]
+        else:
+            workers = min(self._max_concurrency, len(self._retrievers))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="course-retrieval") as executor:
+                results = list(executor.map(lambda item: search(*item), self._retrievers.items()))
+        return self._rerank(merge_candidates(results), query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def search(course_name: str, retriever: BaseRetriever) -> List[NodeWithScore]:
+            async with semaphore:
+                try:
+                    return await retriever.aretrieve(query_bundle)
+                except Exception as e:
+                    logger.error(f"Retrieval from {course_name} failed: {e}")
+                    return []
+
+        results = await asyncio.gather(*(search(name, retriever) for name, retriever in self._retrievers.items()))
+        return await asyncio.get_running_loop().run_in_executor(
+            self._rerank_executor, self._rerank, merge_candidates(list(results)), query_bundle)
+
+    def _rerank(self, candidates: List[NodeWithScore], query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if not candidates:
+            return []
+        return self._reranker.postprocess_nodes(candidates, query_bundle=query_bundle)
@@ -1,15 +1,50 @@
-from llama_index.agent.openai import OpenAIAssistantAgent
+import asyncio
+import time
+from typing import AsyncGenerator, AsyncIterator, List, Optional, Union
+
+from llama_index.agent.openai import OpenAIAgent
+from llama_index.core import Settings
+from llama_index.core.base.llms.types import ChatMessage
+from llama_index.core.chat_engine.types import StreamingAgentChatResponse
+from llama_index.core.llms import LLM
+from llama_index.core.tools import QueryEngineTool
 from openai import OpenAI
 
 from chatplatform.core.config import settings, logger
 from chatplatform.db.models.gpt_preset import GptPreset
 from chatplatform.db.session import DBSession
 from chatplatform.schemas.course import CoursesGPTRequest
-from chatplatform.schemas.gpt_model import GptModelName, PresetResponse, PresetSchemasResponse
+from chatplatform.schemas.gpt_model import ChatMode, GptModelName, PresetResponse, PresetSchemasResponse
+from chatplatform.services.agent_pool_service import agent_key, agent_pool
+from chatplatform.services.answer_cache_service import answer_cache, answer_scope
+from chatplatform.services.context_packing_service import context_token_budget, count_tokens
+from chatplatform.services.direct_answer_service import DirectAnswer, answer_directly
 from chatplatform.services.document_indexer_service import DocumentIndexer
+from chatplatform.services.latency_metrics import LatencyWindow
+from chatplatform.services.llm_client_service import llm_client
+from chatplatform.services.llm_hedging_service import llm_deadline, request_deadline_seconds
+from chatplatform.services.llm_scheduler_service import llm_scheduler
+from chatplatform.services.model_router_service import model_router
+from chatplatform.services.preset_cache_service import ResolvedPreset, preset_cache
 
 db_session = DBSession().get_db()
 
+AGENT_INSTRUCTIONS = ("You are an assistant with access to course documents. Use these documents to inform your "
+                      "answers. Please provide detailed, accurate, and informative answers.")
+ERROR_MESSAGE = "Failed to get response from GPT."
+TIMEOUT_MESSAGE = "GPT did not answer in time."
+
+time_to_first_token = LatencyWindow()
+response_time = LatencyWindow()
+
+
+def course_names_for(courses_request: CoursesGPTRequest) -> List[str]:
+    return [course.title.replace(" ", "_") for course in courses_request.courses]
+
+
+def course_titles_for(courses_request: CoursesGPTRequest) -> List[str]:
+    return [course.title for course in courses_request.courses]
+
 
 def is_chat_model(model_name: str) -> bool:
     """
@@ -19,51 +54,234 @@ def is_chat_model(model_name: str) -> bool:
     return model_name in chat_models
 
 
+async def coalesce_deltas(deltas: AsyncIterator[str], interval: float) -> AsyncGenerator[str, None]:
+    """
+    Joins streamed deltas into chunks sent at most every `interval` seconds. A delta arriving after a quiet
+    period is passed on immediately, so coalescing never delays the first token.
+    """
+    if interval <= 0:
+        async for delta in deltas:
+            yield delta
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = deltas.__aiter__()
+    buffer = []
+    last_sent = float("-inf")
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(last_sent + interval - loop.time(), 0) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if pending in done:
+                finished, pending = pending, None
+                try:
+                    buffer.append(finished.result())
+                except StopAsyncIteration:
+                    break
+            if buffer and loop.time() >= last_sent + interval:
+                yield "".join(buffer)
+                buffer = []
+                last_sent = loop.time()
+    finally:
+        if pending is not None:
+            pending.cancel()
+    if buffer:
+        yield "".join(buffer)
+
+
+def source_file_names(response: Union[StreamingAgentChatResponse, DirectAnswer]) -> list:
+    nodes = list(response.source_nodes)
+    for tool_output in response.sources:
+        nodes.extend(getattr(tool_output.raw_output, "source_nodes", None) or [])
+    return sorted({node.node.metadata["file_name"] for node in nodes if node.node.metadata.get("file_name")})
+
+
 class GptChatService:
-    def __init__(self, db):
+    def __init__(self, db, llm: Optional[LLM] = None):
         self.client = OpenAI(api_key=settings.OPENAPI_KEY)
         self.indexer = DocumentIndexer(db)
         self.db = db
+        # An injected LLM answers every request regardless of presets and routing.
+        self._llm_override = llm
+        # Any OpenAI-compatible endpoint works, e.g. a local fake streaming server configured via api_base.
+        self.llm = llm or Settings.llm
 
     def create_gpt_preset(self, preset_data: dict) -> GptPreset:
         # Convert the Enum to its value (str) before saving
         if 'model' in preset_data and isinstance(preset_data['model'], GptModelName):
             preset_data['model'] = preset_data['model'].value
+        if 'chat_mode' in preset_data and isinstance(preset_data['chat_mode'], ChatMode):
+            preset_data['chat_mode'] = preset_data['chat_mode'].value
         db_preset = GptPreset(**preset_data)
         self.db.add(db_preset)
         self.db.commit()
         self.db.refresh(db_preset)
+        preset_cache.invalidate()
         return db_preset
 
-    async def request_nlp(self, initial_message: str, courses: CoursesGPTRequest):
-        response = await self.ask_gpt(initial_message, courses)
-        yield response
+    async def request_nlp(self, initial_message: str, courses: CoursesGPTRequest, admin_id: int,
+                          preset_id: Optional[int] = None, chat_history: Optional[List[ChatMessage]] = None) \
+            -> AsyncGenerator[dict, None]:
+        """
+        Streams the answer as WebSocket frames: {"message": text} frames carrying the next part of the answer,
+        followed by a single {"done": true, ...} frame with completion metadata, or an {"error": ...} frame.
+        Requests waiting for the LLM scheduler first get {"queued": true, "position": n} frames.
+        Answers that depend on earlier turns in `chat_history` bypass the answer cache.
 
-    async def ask_gpt(self, initial_message: str, courses_request: CoursesGPTRequest) -> str:
+        The model, temperature, max_tokens and chat mode come from the selected preset, or else from the first
+        preset of the requested courses; simple questions may be routed to the fast model tier.
+        """
+        started = time.perf_counter()
+        first_token_seconds = None
+        frames = 0
+        parts = []
+        ticket = None
+        queued_seconds = 0.0
+        deadline = None
+        try:
+            preset = preset_cache.resolve(self.db, admin_id, preset_id, course_titles_for(courses))
+            chat_mode = ChatMode(preset.chat_mode) if preset is not None else ChatMode.AGENT
+            llm = self.llm_for(preset, initial_message)
+            preset_id = preset.id if preset is not None else None
+            course_names = course_names_for(courses)
+            scope = answer_scope(course_names, preset_id)
+            versions = self.indexer.course_versions(course_names)
+            query_embedding = None
+            if settings.ANSWER_CACHE_ENABLED and not chat_history:
+                query_embedding = await Settings.embed_model.aget_query_embedding(initial_message)
+                cached = answer_cache.lookup(scope, initial_message, query_embedding, versions)
+                if cached is not None:
+                    yield {"message": cached.answer}
+                    yield {
+                        "done": True,
+                        "mode": chat_mode.value,
+                        "cached": True,
+                        "similarity": round(cached.similarity, 4),
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                        "sources": cached.sources,
+                    }
+                    return
+
+            if llm_scheduler.enabled:
+                ticket = llm_scheduler.submit(admin_id, self.estimate_tokens(initial_message, preset, chat_history))
+                async for position in llm_scheduler.wait_turn(ticket):
+                    yield {"queued": True, "position": position}
+                queued_seconds = time.monotonic() - ticket.enqueued_at
+            # Set in the task handling the request, so the agent's streaming task started below inherits it.
+            deadline = time.monotonic() + request_deadline_seconds(preset.max_tokens if preset else None)
+            llm_deadline.set(deadline)
+            response = await self.ask_gpt(initial_message, courses, admin_id, preset_id, chat_mode,
+                                          chat_history, llm)
+            if response is None:
+                yield {"error": "Error: Unable to process the request due to missing course data."}
+                return
+            interval = settings.STREAM_FRAME_INTERVAL_MS / 1000
+            async for text in coalesce_deltas(response.async_response_gen(), interval):
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - started
+                    time_to_first_token.record(first_token_seconds)
+                frames += 1
+                parts.append(text)
+                yield {"message": text}
+        except asyncio.TimeoutError:
+            logger.error("Streaming answer exceeded its deadline")
+            yield {"error": TIMEOUT_MESSAGE}
+            return
+        except Exception as e:
+            logger.error(f"Streaming answer failed: {e}")
+            yield {"error": ERROR_MESSAGE}
+            return
+        finally:
+            llm_deadline.set(None)
+            if ticket is not None:
+                llm_scheduler.release(ticket)
+        if deadline is not None and time.monotonic() >= deadline:
+            # The agent logs and swallows a timeout of its streaming task, leaving a truncated answer.
+            yield {"error": TIMEOUT_MESSAGE}
+            return
+        answer = "".join(parts)
+        if not answer:
+            # The agent logs and swallows upstream errors, leaving an empty stream.
+            yield {"error": ERROR_MESSAGE}
+            return
+
+        duration = time.perf_counter() - started
+        response_time.record(duration)
+        sources = source_file_names(response)
+        if query_embedding is not None:
+            answer_cache.store(scope, initial_message, query_embedding, versions, answer, sources)
+        yield {
+            "done": True,
+            "model": llm.model,
+            "routed": llm.model != (preset.model if preset is not None else settings.DEFAULT_CHAT_MODEL),
+            "mode": chat_mode.value,
+            "cached": False,
+            "queued_ms": round(queued_seconds * 1000, 1),
+            "time_to_first_token_ms": round(first_token_seconds * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+            "frames": frames,
+            "characters": len(answer),
+            "sources": sources,
+        }
+
+    @staticmethod
+    def estimate_tokens(message: str, preset: Optional[ResolvedPreset],
+                        chat_history: Optional[List[ChatMessage]] = None) -> int:
+        """
+        Estimates the tokens a request uses, to charge it against its admin's fair share before it runs.
+        """
+        history_tokens = sum(count_tokens(message.content or "") for message in chat_history or [])
+        answer_tokens = preset.max_tokens if preset is not None else settings.LLM_ANSWER_TOKENS_ESTIMATE
+        return count_tokens(message) + history_tokens + settings.LLM_PROMPT_TOKENS_ESTIMATE + answer_tokens
+
+    def llm_for(self, preset: Optional[ResolvedPreset], message: str) -> LLM:
+        """
+        Returns the client answering `message` with the settings of `preset`.
+        """
+        if self._llm_override is not None:
+            return self._llm_override
+        if preset is None:
+            return llm_client(model_router.route(settings.DEFAULT_CHAT_MODEL, message), settings.DEFAULT_TEMPERATURE)
+        return llm_client(model_router.route(preset.model, message), preset.temperature, preset.max_tokens)
+
+    async def ask_gpt(self, initial_message: str, courses_request: CoursesGPTRequest, admin_id: int,
+                      preset_id: Optional[int] = None, chat_mode: ChatMode = ChatMode.AGENT,
+                      chat_history: Optional[List[ChatMessage]] = None, llm: Optional[LLM] = None) \
+            -> Optional[Union[StreamingAgentChatResponse, DirectAnswer]]:
         """
         Uses OpenAI's GPT to answer a question based on the indexed documents of specified courses.
+        Returns a response whose tokens are streamed as the model produces them.
         """
-        query_engine_tools = []
-        for course in courses_request.courses:
-            course_name = course.title.replace(" ", "_")
-            tool = await self.indexer.ensure_tool_for_course(course_name)
-            if tool:
-                query_engine_tools.append(tool)
-
-        if not query_engine_tools:
-            logger.error("No query engines loaded for the requested courses.")
-            return "Error: Unable to process the request due to missing course data."
-
-        agent = OpenAIAssistantAgent.from_new(
-            name="Document Context GPT",
-            instructions="You are an assistant with access to course documents. Use these documents to inform your answers.",
-            tools=query_engine_tools,
-            openai_tools=[],
-            files=[],
-            instructions_prefix="Please provide detailed, accurate, and informative answers."
+        llm = llm or self.llm
+        course_names = course_names_for(courses_request)
+        if chat_mode == ChatMode.DIRECT:
+            retriever = await self.indexer.afederated_retriever(course_names)
+            if retriever is None:
+                logger.error("No query engines loaded for the requested courses.")
+                return None
+            return await answer_directly(llm, retriever, initial_message, context_token_budget(llm.model),
+                                         chat_history)
+
+        agent = await agent_pool.get_agent(
+            agent_key(admin_id, course_names, preset_id, llm.model),
+            self.indexer.course_versions(course_names),
+            tool_factory=lambda: self.indexer.ensure_federated_tool(course_names, llm),
+            agent_factory=lambda tool: self.create_agent(tool, chat_history, llm),
         )
-        response = agent.chat(initial_message)
-        return response.response
+        if agent is None:
+            logger.error("No query engines loaded for the requested courses.")
+            return None
+        return await agent.astream_chat(initial_message)
+
+    def create_agent(self, tool: QueryEngineTool, chat_history: Optional[List[ChatMessage]] = None,
+                     llm: Optional[LLM] = None) -> OpenAIAgent:
+        # Assistants API runs cannot be streamed with the pinned openai client, so the answer comes from
+        # a function-calling agent over the chat completions API, which streams the final answer.
+        return OpenAIAgent.from_tools(tools=[tool], llm=llm or self.llm, chat_history=list(chat_history or []),
+                                      system_prompt=AGENT_INSTRUCTIONS)
 
     def get_presets(self, user_id: int) -> PresetSchemasResponse:
         # Fetch presets filtered by the given user_id, which seems to be intended as a course_id.
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from chatplatform.core.config import settings, logger
+
+
+def directory_size(path: Path) -> int:
+    """
+    Returns the total size in bytes of all files below the given directory.
+    """
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class CourseIndexCache:
+    """
+    Process-wide LRU cache of loaded course indexes.
+
+    Entries are bounded by count and by an estimated byte size (the size of the persisted index on disk).
+    Loading is done at most once per course at a time; concurrent misses for the same course wait for
+    the first load instead of deserializing the index again.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int, Hashable]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, course_name: str, loader: Callable[[], Tuple[Any, int]],
+                    version: Optional[Hashable] = None) -> Any:
+        """
+        Returns the cached index for a course, loading it with `loader` on a miss.
+
+        :param course_name: Cache key, the course directory name.
+        :param loader: Callable returning a tuple of (index, size in bytes).
+        :param version: Stamp of the persisted index. A cached entry with a different stamp is treated as
+            stale, which lets worker processes pick up indexes persisted by other processes.
+        """
+        index = self._get(course_name, version)
+        if index is not None:
+            return index
+
+        with self._load_lock(course_name):
+            # Another caller may have loaded the course while we were waiting for the lock.
+            index = self._get(course_name, version, count_miss=False)
+            if index is not None:
+                return index
+            generation = self._generations.get(course_name, 0)
+            index, size = loader()
+            with self._lock:
+                # Skip caching a version that was invalidated while it was being loaded.
+                if self._generations.get(course_name, 0) == generation:
+                    self._put(course_name, index, size, version)
+            return index
+
+    def invalidate(self, course_name: str) -> None:
+        """
+        Drops a course from the cache, e.g. after a new version of its index has been persisted.
+        """
+        with self._lock:
+            self._generations[course_name] = self._generations.get(course_name, 0) + 1
+            entry = self._entries.pop(course_name, None)
+            if entry:
+                self.total_bytes -= entry[1]
+                logger.info(f"Invalidated cached index for {course_name}")
+
+    def clear(self) -> None:
+        with self._lock:
+            for course_name in list(self._entries):
+                self._generations[course_name] = self._generations.get(course_name, 0) + 1
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def course_names(self) -> List[str]:
+        """
+        Returns the cached course names, most recently used first.
+        """
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _get(self, course_name: str, version: Optional[Hashable], count_miss: bool = True) -> Any:
+        with self._lock:
+            entry = self._entries.get(course_name)
+            if entry is not None and entry[2] != version:
+                del self._entries[course_name]
+                self.total_bytes -= entry[1]
+                entry = None
+            if entry is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(course_name)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, course_name: str, index: Any, size: int, version: Optional[Hashable]) -> None:
+        previous = self._entries.pop(course_name, None)
+        if previous:
+            self.total_bytes -= previous[1]
+        self._entries[course_name] = (index, size, version)
+        self.total_bytes += size
+        # The newest entry is always kept, even if it alone exceeds the byte budget.
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            evicted_name, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+            logger.info(f"Evicted cached index for {evicted_name} ({evicted_size} bytes)")
+
+    def _load_lock(self, course_name: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(course_name, threading.Lock())
+
+
+index_cache = CourseIndexCache(max_entries=settings.INDEX_CACHE_MAX_ENTRIES,
+                               max_bytes=settings.INDEX_CACHE_MAX_BYTES)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from chatplatform.core.config import logger
+
+MANIFEST_FILENAME = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+SUPERSEDED_FILENAME = "SUPERSEDED"
+# Directory used before versioned snapshots existed; served until the first snapshot is published.
+LEGACY_DIRNAME = "files"
+
+
+class IndexSnapshotStore:
+    """
+    Versioned, atomically published course index snapshots.
+
+    Every build is persisted into a fresh `<course>/versions/<version>` directory. Once complete, it is
+    published by atomically replacing the `<course>/CURRENT` manifest that names the live version, so
+    readers only ever see complete snapshots. Superseded versions are deleted after a grace period,
+    giving readers that resolved the old version time to finish loading it.
+    """
+
+    def __init__(self, storage_path: Path, grace_seconds: float):
+        self.storage_path = storage_path
+        self.grace_seconds = grace_seconds
+
+    def current_version(self, course_name: str) -> Optional[str]:
+        manifest = self.storage_path / course_name / MANIFEST_FILENAME
+        try:
+            version = manifest.read_text().strip()
+        except FileNotFoundError:
+            version = ""
+        if version:
+            return version
+        legacy_docstore = self.storage_path / course_name / LEGACY_DIRNAME / "docstore.json"
+        if legacy_docstore.exists():
+            return f"{LEGACY_DIRNAME}:{legacy_docstore.stat().st_mtime_ns}"
+        return None
+
+    def path_for(self, course_name: str, version: str) -> Path:
+        if version.startswith(f"{LEGACY_DIRNAME}:"):
+            return self.storage_path / course_name / LEGACY_DIRNAME
+        return self.storage_path / course_name / VERSIONS_DIRNAME / version
+
+    def current_path(self, course_name: str) -> Optional[Path]:
+        version = self.current_version(course_name)
+        return self.path_for(course_name, version) if version else None
+
+    def new_version_path(self, course_name: str) -> Path:
+        version = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        path = self.storage_path / course_name / VERSIONS_DIRNAME / version
+        path.mkdir(parents=True)
+        return path
+
+    def publish(self, course_name: str, version_path: Path) -> None:
+        """
+        Makes a completely persisted version the live one. Callers must hold the course lock.
+        """
+        course_dir = self.storage_path / course_name
+        previous = self.current_path(course_name)
+        manifest_tmp = course_dir / f"{MANIFEST_FILENAME}.{uuid.uuid4().hex}.tmp"
+        manifest_tmp.write_text(version_path.name)
+        os.replace(manifest_tmp, course_dir / MANIFEST_FILENAME)
+        if previous is not None and previous.exists():
+            (previous / SUPERSEDED_FILENAME).touch()
+        logger.info(f"Published index version {version_path.name} for {course_name}")
+        self.collect_garbage(course_name)
+
+    def collect_garbage(self, course_name: str) -> None:
+        """
+        Deletes versions that were superseded (or abandoned by a failed build) longer than the grace
+        period ago. Callers must hold the course lock, so no build is in progress.
+        """
+        course_dir = self.storage_path / course_name
+        current = self.current_path(course_name)
+        candidates = list((course_dir / VERSIONS_DIRNAME).glob("*"))
+        legacy_dir = course_dir / LEGACY_DIRNAME
+        if legacy_dir.exists() and current != legacy_dir:
+            candidates.append(legacy_dir)
+
+        now = time.time()
+        for path in candidates:
+            if path == current or not path.is_dir():
+                continue
+            marker = path / SUPERSEDED_FILENAME
+            retired_at = marker.stat().st_mtime if marker.exists() else path.stat().st_mtime
+            if now - retired_at > self.grace_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed old index version {path.name} of {course_name}")
@@ -0,0 +1,49 @@
+import datetime
+from typing import Optional
+
+from chatplatform.db.models.indexing_job import IndexingJob
+from chatplatform.schemas.document import IndexingJobStatus
+
+
+class IndexingJobService:
+    """
+    Tracks the status of background indexing jobs.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def create_job(self, course_id: int, document_id: Optional[int] = None) -> IndexingJob:
+        job = IndexingJob(document_id=document_id, course_id=course_id,
+                          status=IndexingJobStatus.QUEUED.value, created_at=datetime.datetime.now())
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get_job(self, job_id: int) -> Optional[IndexingJob]:
+        return self.db.query(IndexingJob).filter(IndexingJob.id == job_id).first()
+
+    def get_latest_job_for_document(self, document_id: int) -> Optional[IndexingJob]:
+        return self.db.query(IndexingJob).filter(IndexingJob.document_id == document_id) \
+            .order_by(IndexingJob.id.desc()).first()
+
+    def mark_running(self, job_id: int) -> None:
+        self._update(job_id, status=IndexingJobStatus.RUNNING.value, started_at=datetime.datetime.now())
+
+    def mark_done(self, job_id: int) -> None:
+        self._update(job_id, status=IndexingJobStatus.DONE.value, finished_at=datetime.datetime.now())
+
+    def mark_failed(self, job_id: int, error: str) -> None:
+        self._update(job_id, status=IndexingJobStatus.FAILED.value, error=error,
+                     finished_at=datetime.datetime.now())
+
+    def _update(self, job_id: int, **fields) -> None:
+        job = self.get_job(job_id)
+        if job is None:
+            return
+        for name, value in fields.items():
+            setattr(job, name, value)
+        if job.started_at is None and job.finished_at is not None:
+            job.started_at = job.finished_at
+        self.db.commit()
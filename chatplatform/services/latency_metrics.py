@@ -0,0 +1,45 @@
+import threading
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+
+class LatencyWindow:
+    """
+    Keeps the most recent latency samples (in seconds) and reports percentiles over them.
+    """
+
+    def __init__(self, size: int = 1000):
+        self._samples = deque(maxlen=size)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    @property
+    def samples(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples)
+        return float(np.percentile(samples, percent)) if samples else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+            count = self._count
+        if not samples:
+            return {"count": count, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        p50, p95 = np.percentile(samples, [50, 95])
+        return {
+            "count": count,
+            "p50_ms": round(float(p50) * 1000, 1),
+            "p95_ms": round(float(p95) * 1000, 1),
+            "max_ms": round(max(samples) * 1000, 1),
+        }
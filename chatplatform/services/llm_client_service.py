@@ -0,0 +1,48 @@
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, ChatResponseAsyncGen
+from llama_index.llms.openai import OpenAI
+
+from chatplatform.core.config import settings
+from chatplatform.services.llm_hedging_service import first_chunk, hedged_calls
+
+
+class HedgedOpenAI(OpenAI):
+    """
+    OpenAI client whose async chat calls are bounded by the request deadline, hedged and retried
+    (see HedgedCalls). Retries are left to HedgedCalls, so the client itself does not retry.
+    """
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await hedged_calls.call(self.model, False,
+                                       lambda: super(HedgedOpenAI, self).achat(messages, **kwargs))
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        async def attempt():
+            return await first_chunk(await super(HedgedOpenAI, self).astream_chat(messages, **kwargs))
+
+        async def discard(started):
+            await started[0].aclose()
+
+        stream, first = await hedged_calls.call(self.model, True, attempt, discard)
+        return hedged_calls.rest_of_stream(stream, first)
+
+
+_clients: Dict[Tuple[str, float, Optional[int]], HedgedOpenAI] = {}
+_lock = threading.Lock()
+
+
+def llm_client(model: str, temperature: float, max_tokens: Optional[int] = None) -> HedgedOpenAI:
+    """
+    Returns the shared LLM client for a model and its sampling settings, so that HTTP connections are reused
+    across requests instead of opening new ones per message.
+    """
+    key = (model, temperature, max_tokens)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = HedgedOpenAI(model=model, temperature=temperature, max_tokens=max_tokens,
+                                  api_base=settings.OPENAI_API_BASE, max_retries=0)
+            _clients[key] = client
+    return client
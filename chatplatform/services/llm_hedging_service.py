@@ -0,0 +1,203 @@
+import asyncio
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from chatplatform.core.config import settings, logger
+from chatplatform.services.latency_metrics import LatencyWindow
+
+T = TypeVar("T")
+
+# Monotonic time by which the LLM calls of the current request must be done. Tasks started while handling
+# the request (e.g. an agent's streaming task) inherit it.
+llm_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+def request_deadline_seconds(max_tokens: Optional[int]) -> float:
+    """
+    Time allowed for answering with a preset that may produce `max_tokens` tokens.
+    """
+    answer_tokens = max_tokens or settings.LLM_ANSWER_TOKENS_ESTIMATE
+    return settings.LLM_DEADLINE_SECONDS + answer_tokens / settings.LLM_DEADLINE_TOKENS_PER_SECOND
+
+
+def current_deadline() -> float:
+    deadline = llm_deadline.get()
+    return deadline if deadline is not None else time.monotonic() + settings.LLM_DEADLINE_SECONDS
+
+
+def deadline_exceeded() -> bool:
+    deadline = llm_deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+async def first_chunk(stream: AsyncIterator[Any]) -> Tuple[AsyncIterator[Any], Optional[Any]]:
+    """
+    Waits for the first chunk of `stream`, returning it together with the stream (None if it is empty).
+    """
+    try:
+        return stream, await stream.__anext__()
+    except StopAsyncIteration:
+        return stream, None
+    except BaseException:
+        await stream.aclose()
+        raise
+
+
+class HedgedCalls:
+    """
+    Runs LLM calls within the deadline of the request they belong to.
+
+    A call that has not answered (or, for streams, produced its first chunk) after the p95 latency of its
+    model times `hedge_factor` gets a duplicate; whichever answers first is used and the other is cancelled.
+    Calls failing before they answered are retried with jittered exponential backoff, as long as the backoff
+    ends before the deadline. Chunks after the first are bounded by the deadline only, since a streamed
+    answer cannot be restarted once parts of it were sent.
+    """
+
+    def __init__(self, hedge_factor: float, hedge_min_delay: float, hedge_min_samples: int, max_retries: int,
+                 backoff_base: float, backoff_max: float, hedging_enabled: bool = True):
+        self.hedge_factor = hedge_factor
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedging_enabled = hedging_enabled
+        # (model, streaming) -> time until the answer or, for streams, its first chunk
+        self.latency: Dict[Tuple[str, bool], LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self._hedges_fired = 0
+        self._hedges_won = 0
+        self._retries = 0
+        self._deadlines_exceeded = 0
+
+    def _window(self, model: str, streaming: bool) -> LatencyWindow:
+        with self._lock:
+            return self.latency.setdefault((model, streaming), LatencyWindow())
+
+    def p95(self, model: str, streaming: bool) -> Optional[float]:
+        return self._window(model, streaming).percentile(95)
+
+    def hedge_delay(self, model: str, streaming: bool) -> Optional[float]:
+        """
+        Returns how long to wait before firing a hedge, or None while too few latencies are known.
+        """
+        window = self._window(model, streaming)
+        if not self.hedging_enabled or window.samples < self.hedge_min_samples:
+            return None
+        return max(window.percentile(95) * self.hedge_factor, self.hedge_min_delay)
+
+    async def call(self, model: str, streaming: bool, attempt: Callable[[], Awaitable[T]],
+                   discard: Optional[Callable[[T], Awaitable[None]]] = None) -> T:
+        """
+        Returns the result of the first successful `attempt`. Results of hedges that lost but completed
+        anyway are passed to `discard`.
+        """
+        deadline = current_deadline()
+        retry = 0
+        while True:
+            try:
+                return await self._race(model, streaming, attempt, discard, deadline)
+            except asyncio.TimeoutError:
+                self._deadlines_exceeded += 1
+                raise
+            except Exception as e:
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+                if retry >= self.max_retries or time.monotonic() + backoff >= deadline:
+                    raise
+                retry += 1
+                self._retries += 1
+                logger.warning(f"LLM call to {model} failed, retrying in {backoff:.2f}s: {e}")
+                await asyncio.sleep(backoff)
+
+    async def _race(self, model: str, streaming: bool, attempt: Callable[[], Awaitable[T]],
+                    discard: Optional[Callable[[T], Awaitable[None]]], deadline: float) -> T:
+        window = self._window(model, streaming)
+        started = {}
+
+        def start() -> asyncio.Future:
+            task = asyncio.ensure_future(attempt())
+            started[task] = time.monotonic()
+            return task
+
+        primary = start()
+        pending = {primary}
+        hedge = None
+        delay = self.hedge_delay(model, streaming)
+        error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise asyncio.TimeoutError()
+                timeout = deadline - now
+                if hedge is None and delay is not None:
+                    timeout = min(timeout, max(started[primary] + delay - now, 0))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    window.record(time.monotonic() - started[winner])
+                    if winner is hedge:
+                        self._hedges_won += 1
+                    return winner.result()
+
+                if hedge is None and delay is not None and pending and \
+                        time.monotonic() >= started[primary] + delay:
+                    hedge = start()
+                    pending.add(hedge)
+                    self._hedges_fired += 1
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def rest_of_stream(self, stream: AsyncIterator[Any], first: Optional[Any]) -> AsyncIterator[Any]:
+        """
+        Yields `first` and the remaining chunks of `stream`, raising asyncio.TimeoutError at the deadline.
+        """
+        deadline = current_deadline()
+        try:
+            if first is None:
+                return
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), max(deadline - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self._deadlines_exceeded += 1
+                    raise
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            latency = {f"{model}{' (stream)' if streaming else ''}": window.stats()
+                       for (model, streaming), window in self.latency.items()}
+        return {
+            "hedging_enabled": self.hedging_enabled,
+            "hedges_fired": self._hedges_fired,
+            "hedges_won": self._hedges_won,
+            "retries": self._retries,
+            "deadlines_exceeded": self._deadlines_exceeded,
+            "latency": latency,
+        }
+
+
+hedged_calls = HedgedCalls(settings.LLM_HEDGE_P95_FACTOR, settings.LLM_HEDGE_MIN_DELAY_MS / 1000,
+                           settings.LLM_HEDGE_MIN_SAMPLES, settings.LLM_MAX_RETRIES,
+                           settings.LLM_RETRY_BACKOFF_MS / 1000, settings.LLM_RETRY_BACKOFF_MAX_MS / 1000,
+                           hedging_enabled=settings.LLM_HEDGING_ENABLED)
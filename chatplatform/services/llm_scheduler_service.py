@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import AsyncGenerator, Deque, Dict, List, Optional, Tuple
+
+from chatplatform.core.config import settings
+from chatplatform.services.latency_metrics import LatencyWindow
+
+BUDGET_WINDOW_SECONDS = 60.0
+POSITION_POLL_SECONDS = 0.5
+
+
+class Ticket:
+    """
+    Place of one LLM request in the scheduler queue. Tickets are served in order of their virtual finish time.
+    """
+
+    def __init__(self, admin_id: int, cost: int, start: float, finish: float, sequence: int):
+        self.admin_id = admin_id
+        self.cost = cost
+        self.start = start
+        self.finish = finish
+        self.sequence = sequence
+        self.enqueued_at = time.monotonic()
+        self.granted = asyncio.get_running_loop().create_future()
+        self.released = False
+
+    @property
+    def order(self) -> Tuple[float, int]:
+        return self.finish, self.sequence
+
+
+class FairScheduler:
+    """
+    Admits LLM requests so one tenant cannot starve the others or exhaust the shared upstream rate limit.
+
+    At most `max_concurrency` requests run at a time. Waiting requests are served by weighted fair queuing
+    per admin: each request advances its admin's virtual clock by its estimated tokens divided by the admin's
+    weight, and the request with the earliest virtual finish time goes next. An admin whose requests used
+    `tokens_per_minute` within the last minute waits until enough of them fall out of the window, while
+    other admins keep being served.
+    """
+
+    def __init__(self, max_concurrency: int, tokens_per_minute: int, weights: Optional[Dict[int, float]] = None,
+                 enabled: bool = True):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.weights = weights or {}
+        self.enabled = enabled
+        self.queue_time = LatencyWindow()
+        self._waiting: List[Ticket] = []
+        self._active = 0
+        self._virtual_time = 0.0
+        self._last_finish: Dict[int, float] = {}
+        self._usage: Dict[int, Deque[Tuple[float, int]]] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._granted = 0
+        self._queued = 0
+
+    def submit(self, admin_id: int, cost: int) -> Ticket:
+        """
+        Enqueues a request estimated to use `cost` tokens. Its ticket is granted right away if it may run.
+        """
+        weight = self.weights.get(admin_id, 1.0)
+        start = max(self._virtual_time, self._last_finish.get(admin_id, 0.0))
+        ticket = Ticket(admin_id, cost, start, start + cost / weight, next(self._sequence))
+        self._last_finish[admin_id] = ticket.finish
+        self._waiting.append(ticket)
+        self._dispatch()
+        if not ticket.granted.done():
+            self._queued += 1
+        return ticket
+
+    async def wait_turn(self, ticket: Ticket) -> AsyncGenerator[int, None]:
+        """
+        Yields the queue position of `ticket` whenever it changes, until the ticket is granted.
+        """
+        last_position = None
+        while not ticket.granted.done():
+            position = self.position(ticket)
+            if position != last_position:
+                last_position = position
+                yield position
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.granted), POSITION_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def position(self, ticket: Ticket) -> int:
+        return sum(1 for other in self._waiting if other.order < ticket.order) + 1
+
+    def release(self, ticket: Ticket) -> None:
+        """
+        Frees the slot of a finished request, or withdraws a request that is still waiting.
+        """
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted.done():
+            self._active -= 1
+        else:
+            self._waiting.remove(ticket)
+            ticket.granted.cancel()
+            if self._last_finish.get(ticket.admin_id) == ticket.finish:
+                self._last_finish[ticket.admin_id] = ticket.start
+        self._dispatch()
+
+    def _tokens_used(self, admin_id: int, now: float) -> Deque[Tuple[float, int]]:
+        usage = self._usage.setdefault(admin_id, deque())
+        while usage and now - usage[0][0] >= BUDGET_WINDOW_SECONDS:
+            usage.popleft()
+        return usage
+
+    def _budget_wait(self, ticket: Ticket, now: float) -> float:
+        """
+        Returns how long the admin of `ticket` has to wait for its token budget; 0 if it may run now.
+        """
+        if self.tokens_per_minute <= 0:
+            return 0.0
+        usage = self._tokens_used(ticket.admin_id, now)
+        used = sum(tokens for _, tokens in usage)
+        # A request larger than the whole budget still runs once the admin is idle.
+        if not usage or used + ticket.cost <= self.tokens_per_minute:
+            return 0.0
+        for used_at, tokens in usage:
+            used -= tokens
+            if used + ticket.cost <= self.tokens_per_minute:
+                return used_at + BUDGET_WINDOW_SECONDS - now
+        return usage[-1][0] + BUDGET_WINDOW_SECONDS - now
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        retry_in = None
+        blocked_admins = set()
+        for ticket in sorted(self._waiting, key=lambda waiting: waiting.order):
+            if self._active >= self.max_concurrency:
+                break
+            if ticket.admin_id in blocked_admins:
+                continue
+            wait = self._budget_wait(ticket, now)
+            if wait > 0:
+                # Later requests of the same admin must not overtake this one.
+                blocked_admins.add(ticket.admin_id)
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                continue
+            self._grant(ticket, now)
+
+        if retry_in is not None and self._wakeup is None:
+            def wake():
+                self._wakeup = None
+                self._dispatch()
+
+            self._wakeup = asyncio.get_running_loop().call_later(retry_in, wake)
+
+    def _grant(self, ticket: Ticket, now: float) -> None:
+        self._waiting.remove(ticket)
+        self._active += 1
+        self._granted += 1
+        self._virtual_time = max(self._virtual_time, ticket.start)
+        if self.tokens_per_minute > 0:
+            self._tokens_used(ticket.admin_id, now).append((now, ticket.cost))
+        self.queue_time.record(now - ticket.enqueued_at)
+        ticket.granted.set_result(None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        waiting_by_admin: Dict[int, int] = {}
+        for ticket in self._waiting:
+            waiting_by_admin[ticket.admin_id] = waiting_by_admin.get(ticket.admin_id, 0) + 1
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "waiting": len(self._waiting),
+            "waiting_by_admin": waiting_by_admin,
+            "granted": self._granted,
+            "queued": self._queued,
+            "queue_time": self.queue_time.stats(),
+            "tokens_last_minute": {admin_id: sum(tokens for _, tokens in self._tokens_used(admin_id, now))
+                                   for admin_id in list(self._usage)},
+        }
+
+
+llm_scheduler = FairScheduler(settings.LLM_MAX_CONCURRENCY, settings.LLM_ADMIN_TOKENS_PER_MINUTE,
+                              settings.LLM_ADMIN_WEIGHTS, enabled=settings.LLM_SCHEDULER_ENABLED)
@@ -0,0 +1,64 @@
+import importlib
+import re
+from typing import Callable
+
+from chatplatform.core.config import settings, logger
+from chatplatform.services.llm_hedging_service import hedged_calls
+
+FAQ_PATTERN = re.compile(r"^(what|when|where|who|which|how (many|much|long)) (is|are|was|were|does|do|did)\b")
+
+
+def is_simple_question(message: str) -> bool:
+    """
+    Default routing classifier: short questions and FAQ-like lookups ("when is ...", "what are ...").
+    """
+    text = message.strip().lower()
+    return len(text.split()) <= settings.ROUTING_MAX_QUESTION_WORDS or bool(FAQ_PATTERN.match(text))
+
+
+def load_classifier(path: str) -> Callable[[str], bool]:
+    module_name, _, attribute = path.rpartition(".")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class ModelRouter:
+    """
+    Picks the model that answers a question. Questions the classifier considers simple go to the fast tier,
+    unless its p95 upstream latency (time to the first streamed chunk, as measured by `hedged_calls`) is
+    currently worse than that of the preset's model. Queueing, retrieval and tool work are not part of it.
+    """
+
+    def __init__(self, fast_model: str, classifier: Callable[[str], bool], enabled: bool = False):
+        self.fast_model = fast_model
+        self.classifier = classifier
+        self.enabled = enabled
+        self._routed = 0
+        self._kept = 0
+
+    def route(self, model: str, message: str) -> str:
+        if not self.enabled or not self.fast_model or model == self.fast_model:
+            return model
+        try:
+            simple = self.classifier(message)
+        except Exception as e:
+            logger.error(f"Routing classifier failed: {e}")
+            simple = False
+        fast_p95 = hedged_calls.p95(self.fast_model, True)
+        model_p95 = hedged_calls.p95(model, True)
+        if not simple or (fast_p95 is not None and model_p95 is not None and fast_p95 > model_p95):
+            self._kept += 1
+            return model
+        self._routed += 1
+        return self.fast_model
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "fast_model": self.fast_model,
+            "routed": self._routed,
+            "kept": self._kept,
+        }
+
+
+model_router = ModelRouter(settings.ROUTING_FAST_MODEL, load_classifier(settings.ROUTING_CLASSIFIER),
+                           enabled=settings.ROUTING_ENABLED)
@@ -0,0 +1,239 @@
+import asyncio
+import functools
+import json
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Union
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import SimpleVectorStore
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, \
+    VectorStoreQueryMode, VectorStoreQueryResult
+
+EMBEDDINGS_FILENAME = "embeddings.npy"
+EMBEDDING_IDS_FILENAME = "embedding_ids.json"
+QUANTIZED_FILENAMES = {"float16": "embeddings.f16.npy", "int8": "embeddings.i8.npy"}
+INT8_SCALES_FILENAME = "embeddings.i8.scales.npy"
+# Rows converted to float32 at a time when scoring quantized vectors, bounding temporary memory.
+SCORE_BLOCK_ROWS = 8192
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(embeddings: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Returns the compact form of normalized float32 vectors and, for int8, the per-vector scale factors.
+    """
+    if quantization == "float16":
+        return embeddings.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(embeddings / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization {quantization}")
+
+
+def quantized_scores(quantized: np.ndarray, scales: Optional[np.ndarray], query_embedding: np.ndarray) -> np.ndarray:
+    """
+    Approximate similarities from quantized vectors, computed block by block to avoid a float32 copy
+    of the whole matrix.
+    """
+    scores = np.empty(len(quantized), dtype=np.float32)
+    for start in range(0, len(quantized), SCORE_BLOCK_ROWS):
+        block = np.asarray(quantized[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+        scores[start:start + len(block)] = block @ query_embedding
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store keeping the embeddings of a course in one contiguous float32 matrix.
+
+    Rows are L2-normalized, so cosine top-k is a single matrix-vector product followed by `argpartition`.
+    Persisted embeddings are opened with `mmap`, which makes loading nearly free and lets worker
+    processes share the pages through the OS page cache. Node and ref-doc ids live in a side file.
+
+    With `quantization` set to "float16" or "int8" (per-vector scale), searches scan a compact copy of the
+    vectors and re-score a shortlist of `rescore_factor * k` candidates exactly against the float32 rows,
+    so only the compact matrix has to stay resident.
+    """
+
+    stores_text: bool = False
+    quantization: str = "none"
+    rescore_factor: int = 4
+
+    _embeddings: Optional[np.ndarray] = PrivateAttr()
+    _node_ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[str] = PrivateAttr()
+    _quantized: Optional[np.ndarray] = PrivateAttr()
+    _scales: Optional[np.ndarray] = PrivateAttr()
+
+    def __init__(self, embeddings: Optional[np.ndarray] = None, node_ids: Optional[List[str]] = None,
+                 ref_doc_ids: Optional[List[str]] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._embeddings = embeddings
+        self._node_ids = list(node_ids or [])
+        self._ref_doc_ids = list(ref_doc_ids or [])
+        self._quantized = None
+        self._scales = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @staticmethod
+    def exists(persist_dir: Union[str, Path]) -> bool:
+        return (Path(persist_dir) / EMBEDDINGS_FILENAME).exists()
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: Union[str, Path], **kwargs: Any) -> "NumpyVectorStore":
+        persist_dir = Path(persist_dir)
+        embeddings = np.load(persist_dir / EMBEDDINGS_FILENAME, mmap_mode="r")
+        with open(persist_dir / EMBEDDING_IDS_FILENAME) as ids_file:
+            ids = json.load(ids_file)
+        store = cls(embeddings=embeddings, node_ids=ids["node_ids"], ref_doc_ids=ids["ref_doc_ids"], **kwargs)
+        quantized_path = persist_dir / QUANTIZED_FILENAMES.get(store.quantization, "")
+        if store.quantization != "none" and quantized_path.is_file():
+            store._quantized = np.load(quantized_path, mmap_mode="r")
+            if store.quantization == "int8":
+                store._scales = np.load(persist_dir / INT8_SCALES_FILENAME)
+        return store
+
+    @classmethod
+    def from_simple_vector_store(cls, simple_store: SimpleVectorStore, **kwargs: Any) -> "NumpyVectorStore":
+        """
+        Converts a llama-index JSON vector store, e.g. one persisted before this store was introduced.
+        """
+        data = simple_store.data
+        node_ids = list(data.embedding_dict)
+        if not node_ids:
+            return cls(**kwargs)
+        embeddings = normalize_rows(np.asarray([data.embedding_dict[i] for i in node_ids], dtype=np.float32))
+        ref_doc_ids = [data.text_id_to_ref_doc_id.get(i) for i in node_ids]
+        return cls(embeddings=embeddings, node_ids=node_ids, ref_doc_ids=ref_doc_ids, **kwargs)
+
+    @property
+    def client(self) -> None:
+        return None
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        new_ids = [node.node_id for node in nodes]
+        existing = set(new_ids).intersection(self._node_ids)
+        if existing:
+            self._keep_rows([node_id not in existing for node_id in self._node_ids])
+
+        vectors = normalize_rows(np.asarray([node.get_embedding() for node in nodes], dtype=np.float32))
+        if self._embeddings is None or len(self._embeddings) == 0:
+            self._embeddings = vectors
+        else:
+            self._embeddings = np.vstack([self._embeddings, vectors])
+        self._node_ids.extend(new_ids)
+        self._ref_doc_ids.extend(node.ref_doc_id for node in nodes)
+        self._quantized = None
+        self._scales = None
+        return new_ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._keep_rows([doc_id != ref_doc_id for doc_id in self._ref_doc_ids])
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("Metadata filters not implemented for NumpyVectorStore")
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Query mode {query.mode} not supported by NumpyVectorStore")
+        if self._embeddings is None or not self._node_ids:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        rows = None
+        if query.node_ids or query.doc_ids:
+            node_ids = set(query.node_ids or [])
+            doc_ids = set(query.doc_ids or [])
+            rows = np.flatnonzero([node_id in node_ids or doc_id in doc_ids
+                                   for node_id, doc_id in zip(self._node_ids, self._ref_doc_ids)])
+            if not len(rows):
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        query_embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_embedding)
+        if norm:
+            query_embedding = query_embedding / norm
+
+        if self.quantization != "none" and rows is None:
+            positions, similarities = self._quantized_top_k(query_embedding, query.similarity_top_k)
+        else:
+            scores = self._embeddings @ query_embedding if rows is None else self._embeddings[rows] @ query_embedding
+            top = top_k_indices(scores, query.similarity_top_k)
+            positions = top if rows is None else rows[top]
+            similarities = scores[top]
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=similarities.tolist(),
+            ids=[self._node_ids[position] for position in positions],
+        )
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        # The full scan (or quantized shortlist) and top-k selection run in a thread, off the event loop.
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(self.query, query, **kwargs))
+
+    def _quantized_top_k(self, query_embedding: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Shortlists candidates on the compact vectors and re-scores them exactly on the float32 rows.
+        """
+        if self._quantized is None:
+            self._quantized, self._scales = quantize(np.asarray(self._embeddings), self.quantization)
+        approximate = quantized_scores(self._quantized, self._scales, query_embedding)
+        shortlist = np.sort(top_k_indices(approximate, k * max(self.rescore_factor, 1)))
+        exact = self._embeddings[shortlist] @ query_embedding
+        top = top_k_indices(exact, k)
+        return shortlist[top], exact[top]
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Writes the embedding matrix and ids next to `persist_path`. Files are written to a temporary name
+        and moved into place, so processes that have the previous matrix mapped keep a consistent view.
+        """
+        persist_dir = Path(persist_path).parent
+        persist_dir.mkdir(parents=True, exist_ok=True)
+        embeddings = self._embeddings if self._embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+
+        embeddings_tmp = persist_dir / f"{EMBEDDINGS_FILENAME}.tmp"
+        with open(embeddings_tmp, "wb") as embeddings_file:
+            np.save(embeddings_file, np.ascontiguousarray(embeddings, dtype=np.float32))
+        ids_tmp = persist_dir / f"{EMBEDDING_IDS_FILENAME}.tmp"
+        with open(ids_tmp, "w") as ids_file:
+            json.dump({"node_ids": self._node_ids, "ref_doc_ids": self._ref_doc_ids}, ids_file)
+        os.replace(embeddings_tmp, persist_dir / EMBEDDINGS_FILENAME)
+        os.replace(ids_tmp, persist_dir / EMBEDDING_IDS_FILENAME)
+
+        if self.quantization != "none" and len(embeddings):
+            quantized, scales = quantize(np.asarray(embeddings, dtype=np.float32), self.quantization)
+            np.save(persist_dir / QUANTIZED_FILENAMES[self.quantization], quantized)
+            if scales is not None:
+                np.save(persist_dir / INT8_SCALES_FILENAME, scales)
+
+    def _keep_rows(self, keep: List[bool]) -> None:
+        if self._embeddings is None or all(keep):
+            return
+        mask = np.asarray(keep, dtype=bool)
+        self._embeddings = np.ascontiguousarray(self._embeddings[mask])
+        self._node_ids = [node_id for node_id, kept in zip(self._node_ids, keep) if kept]
+        self._ref_doc_ids = [doc_id for doc_id, kept in zip(self._ref_doc_ids, keep) if kept]
+        self._quantized = None
+        self._scales = None
@@ -0,0 +1,61 @@
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from chatplatform.core.config import settings
+from chatplatform.db.models.course import Course
+from chatplatform.db.models.gpt_preset import GptPreset
+
+
+class ResolvedPreset(NamedTuple):
+    id: int
+    model: str
+    max_tokens: int
+    temperature: float
+    chat_mode: str
+
+
+class PresetCache:
+    """
+    Resolves the preset of a chat request and caches it for `ttl_seconds`, so a message does not cost a
+    database query. Only presets of the admin's requested courses are considered: the explicitly selected
+    preset wins if it is one of them, otherwise the first preset of those courses is used. Values are copied
+    out of the ORM objects, so they outlive the session that loaded them.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple[int, Tuple[str, ...], Optional[int]], Tuple[float, Optional[ResolvedPreset]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, db, admin_id: int, preset_id: Optional[int], course_titles: List[str]) \
+            -> Optional[ResolvedPreset]:
+        key = (admin_id, tuple(sorted(set(course_titles))), preset_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and now - cached[0] < self.ttl_seconds:
+            return cached[1]
+
+        preset = None
+        if course_titles:
+            course_ids = [course_id for course_id, in db.query(Course.id).filter(
+                Course.created_by == admin_id, Course.title.in_(course_titles))]
+            presets = db.query(GptPreset).filter(GptPreset.course_id.in_(course_ids))
+            if preset_id is not None:
+                # A preset of another admin's course must not be selectable by id.
+                preset = presets.filter(GptPreset.id == preset_id).first()
+            if preset is None:
+                preset = presets.order_by(GptPreset.id).first()
+        resolved = ResolvedPreset(preset.id, preset.model, preset.max_tokens, preset.temperature,
+                                  preset.chat_mode) if preset is not None else None
+        with self._lock:
+            self._entries[key] = (now, resolved)
+        return resolved
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+preset_cache = PresetCache(settings.PRESET_CACHE_TTL_SECONDS)
@@ -0,0 +1,144 @@
+import asyncio
+import re
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from chatplatform.core.config import settings, logger
+from chatplatform.services.preset_cache_service import ResolvedPreset
+
+# (admin id, normalized message, sorted course names, resolved preset)
+CoalescingKey = Tuple[int, str, Tuple[str, ...], Optional[ResolvedPreset]]
+PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(PUNCTUATION.sub(" ", message.lower()).split())
+
+
+def coalescing_key(admin_id: int, message: str, course_names: List[str],
+                   preset: Optional[ResolvedPreset] = None) -> CoalescingKey:
+    """
+    Requests share a computation only within one admin and with the same resolved preset values, so
+    followers get the model and settings they would have got themselves and are charged to the right budget.
+    """
+    return admin_id, normalize_message(message), tuple(sorted(set(course_names))), preset
+
+
+class InFlightRequest:
+    """
+    Frames produced so far by one computation, replayed to every subscriber from the start.
+    """
+
+    def __init__(self):
+        self.frames: List[dict] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+
+    def publish(self, frame: dict) -> None:
+        self.frames.append(frame)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        # Waiters hold the previous event; a fresh one is used for the next change.
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class RequestCoalescer:
+    """
+    Lets concurrent identical requests share one computation (single flight).
+
+    The first request for a key starts the computation as a task of its own; requests arriving while it
+    runs subscribe to its frames instead of computing again, up to `max_followers` per computation, after
+    which they compute independently. Subscribers that go away (e.g. a closed WebSocket) just unsubscribe,
+    so a disconnecting leader does not cut off its followers; the computation is cancelled only when no
+    subscriber is left.
+    """
+
+    def __init__(self, max_followers: int, enabled: bool = True):
+        self.max_followers = max_followers
+        self.enabled = enabled
+        self._in_flight: Dict[CoalescingKey, InFlightRequest] = {}
+        self._leaders = 0
+        self._followers = 0
+        self._bypassed = 0
+        self._cancelled = 0
+
+    async def run(self, key: CoalescingKey,
+                  produce: Callable[[], AsyncIterator[dict]]) -> AsyncGenerator[dict, None]:
+        flight = self._in_flight.get(key) if self.enabled else None
+        if flight is None and self.enabled:
+            flight = InFlightRequest()
+            self._in_flight[key] = flight
+            flight.task = asyncio.create_task(self._drive(key, flight, produce))
+            self._leaders += 1
+            follower = False
+        elif flight is not None and flight.subscribers <= self.max_followers:
+            self._followers += 1
+            follower = True
+        else:
+            if self.enabled:
+                self._bypassed += 1
+            frames = produce()
+            try:
+                async for frame in frames:
+                    yield frame
+            finally:
+                await frames.aclose()
+            return
+
+        flight.subscribers += 1
+        try:
+            position = 0
+            while True:
+                changed = flight.changed
+                while position < len(flight.frames):
+                    frame = flight.frames[position]
+                    position += 1
+                    yield dict(frame, coalesced=True) if follower and frame.get("done") else frame
+                if flight.done:
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more; later requests must not join the cancelled computation.
+                if self._in_flight.get(key) is flight:
+                    del self._in_flight[key]
+                self._cancelled += 1
+                flight.task.cancel()
+
+    async def _drive(self, key: CoalescingKey, flight: InFlightRequest,
+                     produce: Callable[[], AsyncIterator[dict]]) -> None:
+        frames = produce()
+        try:
+            async for frame in frames:
+                flight.publish(frame)
+        except asyncio.CancelledError:
+            logger.info("Coalesced request cancelled, no subscribers left")
+        except Exception as e:
+            logger.error(f"Coalesced request failed: {e}")
+            flight.publish({"error": "Failed to get response from GPT."})
+        finally:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+            flight.finish()
+            await frames.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._in_flight),
+            "leaders": self._leaders,
+            "followers": self._followers,
+            "bypassed": self._bypassed,
+            "cancelled": self._cancelled,
+        }
+
+
+request_coalescer = RequestCoalescer(settings.COALESCING_MAX_FOLLOWERS, enabled=settings.COALESCING_ENABLED)
@@ -0,0 +1,70 @@
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from llama_index.core.postprocessor import SentenceTransformerRerank
+
+from chatplatform.core.config import settings, logger
+
+
+def resident_memory_bytes() -> int:
+    """
+    Returns the current resident set size of this process, falling back to the peak RSS.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RerankerService:
+    """
+    Holds the single cross-encoder reranker of this process.
+
+    The model is loaded on first use (or explicitly at startup via `load`) and the same postprocessor
+    instance is handed to every course query engine. Async callers run reranking on `executor`, a
+    dedicated thread pool, so the CPU-bound model never runs on the event loop.
+    """
+
+    def __init__(self, model: str, top_n: int, workers: int = 2):
+        self.model = model
+        self.top_n = top_n
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+        self._reranker: Optional[SentenceTransformerRerank] = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.memory_bytes: Optional[int] = None
+
+    def get(self) -> SentenceTransformerRerank:
+        if self._reranker is None:
+            self.load()
+        return self._reranker
+
+    def load(self) -> None:
+        with self._lock:
+            if self._reranker is not None:
+                return
+            rss_before = resident_memory_bytes()
+            started = time.perf_counter()
+            self._reranker = SentenceTransformerRerank(model=self.model, top_n=self.top_n)
+            self.load_seconds = time.perf_counter() - started
+            self.memory_bytes = max(resident_memory_bytes() - rss_before, 0)
+            logger.info(f"Loaded reranker {self.model} in {self.load_seconds:.2f}s, "
+                        f"resident memory +{self.memory_bytes / 1024 ** 2:.1f} MiB")
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "top_n": self.top_n,
+            "loaded": self._reranker is not None,
+            "load_seconds": self.load_seconds,
+            "memory_bytes": self.memory_bytes,
+            "process_memory_bytes": resident_memory_bytes(),
+        }
+
+
+reranker_service = RerankerService(model=settings.RERANKER_MODEL, top_n=settings.RERANKER_TOP_N,
+                                   workers=settings.RERANK_WORKERS)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from llama_index.core.schema import NodeWithScore, TextNode
+from sqlalchemy import desc, func
+
+from chatplatform.core.config import settings, logger
+from chatplatform.db.models.course import Course
+from chatplatform.db.models.document import Document
+from chatplatform.db.session import SessionLocal
+from chatplatform.services.document_indexer_service import DocumentIndexer
+from chatplatform.services.index_cache_service import index_cache
+from chatplatform.services.reranker_service import reranker_service
+
+
+class ReadinessState:
+    """
+    Tracks whether this worker has finished warming up and may receive traffic.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.warmup_seconds: Optional[float] = None
+        self.warmed_courses: List[str] = []
+
+
+readiness = ReadinessState()
+
+
+class WarmupService:
+    def __init__(self, db):
+        self.db = db
+        self.indexer = DocumentIndexer(db)
+
+    def hot_course_names(self, limit: int) -> List[str]:
+        """
+        Returns the courses to preload: the ones recorded in the usage file by the previous run of the
+        worker, or else the courses whose documents were updated most recently.
+        """
+        usage_file = Path(settings.WARMUP_USAGE_FILE) if settings.WARMUP_USAGE_FILE else None
+        if usage_file and usage_file.exists():
+            try:
+                with open(usage_file) as f:
+                    return json.load(f)[:limit]
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to read course usage file {usage_file}: {e}")
+
+        rows = self.db.query(Course.title, func.max(Document.updated_at).label("last_used")) \
+            .join(Document, Document.course_id == Course.id) \
+            .group_by(Course.id, Course.title) \
+            .order_by(desc("last_used")) \
+            .limit(limit).all()
+        return [row.title.replace(" ", "_") for row in rows]
+
+    def warm_up(self) -> List[str]:
+        """
+        Loads the reranker (running one prediction to finish torch's lazy init) and the hot course indexes.
+        """
+        reranker = reranker_service.get()
+        reranker.postprocess_nodes([NodeWithScore(node=TextNode(text="warm up"), score=0.0)], query_str="warm up")
+
+        warmed = []
+        for course_name in self.hot_course_names(settings.WARMUP_COURSE_COUNT):
+            try:
+                self.indexer.load_course_index(course_name)
+                warmed.append(course_name)
+            except Exception as e:
+                logger.error(f"Failed to warm up index for {course_name}: {e}")
+        return warmed
+
+
+def warm_up_worker() -> None:
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        readiness.warmed_courses = WarmupService(db).warm_up()
+    except Exception as e:
+        logger.error(f"Warm-up failed, serving cold: {e}")
+    finally:
+        db.close()
+    readiness.warmup_seconds = time.perf_counter() - started
+    readiness.ready = True
+    logger.info(f"Warm-up finished in {readiness.warmup_seconds:.1f}s, "
+                f"preloaded courses: {readiness.warmed_courses}")
+
+
+async def run_warmup() -> None:
+    """
+    Runs the warm-up in a thread so the event loop keeps answering health checks meanwhile.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, warm_up_worker)
+
+
+def collect_index_garbage() -> None:
+    db = SessionLocal()
+    try:
+        DocumentIndexer(db).collect_garbage()
+    finally:
+        db.close()
+
+
+async def run_index_garbage_collection() -> None:
+    """
+    Deletes index versions that expired while no new version of their course was published, in a thread.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, collect_index_garbage)
+
+
+def save_course_usage() -> None:
+    """
+    Records the currently cached courses, most recently used first, for the next warm-up.
+    """
+    if not settings.WARMUP_USAGE_FILE:
+        return
+    try:
+        with open(settings.WARMUP_USAGE_FILE, "w") as f:
+            json.dump(index_cache.course_names(), f)
+    except OSError as e:
+        logger.error(f"Failed to write course usage file {settings.WARMUP_USAGE_FILE}: {e}")
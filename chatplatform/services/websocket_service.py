@@ -1,11 +1,15 @@
 import datetime
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, List, Optional
 
+from chatplatform.core.config import settings
 from chatplatform.db.models.course import Course
 from chatplatform.db.models.external_user import ExternalUser
 from chatplatform.schemas.course import CoursesGPTRequest
-from chatplatform.services.gpt_chat_service import GptChatService
+from chatplatform.services.conversation_service import ConversationMemory, ConversationService
+from chatplatform.services.gpt_chat_service import GptChatService, course_names_for, course_titles_for
 from chatplatform.services.jwt_manager import verify_external_token
+from chatplatform.services.preset_cache_service import preset_cache
+from chatplatform.services.request_coalescing_service import coalescing_key, request_coalescer
 
 
 class WebSocketService:
@@ -20,10 +24,52 @@ class WebSocketService:
             self.db.commit()
         return user
 
-    async def generate_gpt_responses(self, message: str, courses: CoursesGPTRequest) -> AsyncGenerator[str, None]:
+    def start_conversation(self, user: ExternalUser, courses: CoursesGPTRequest, admin_id: int,
+                           preset_id: Optional[int] = None) -> ConversationMemory:
+        preset = preset_cache.resolve(self.db, admin_id, preset_id, course_titles_for(courses))
+        model = preset.model if preset is not None else settings.DEFAULT_CHAT_MODEL
+        return ConversationService(self.db).start(user.id, model)
+
+    def end_conversation(self, conversation: ConversationMemory) -> None:
+        ConversationService(self.db).end(conversation)
+
+    async def generate_gpt_responses(self, message: str, courses: CoursesGPTRequest, admin_id: int,
+                                     preset_id: Optional[int] = None,
+                                     conversation: Optional[ConversationMemory] = None) \
+            -> AsyncGenerator[dict, None]:
         gpt_chat_service = GptChatService(self.db)
-        async for response_chunk in gpt_chat_service.request_nlp(message, courses):
-            yield response_chunk
+        history = conversation.messages() if conversation is not None else []
+
+        def produce():
+            return gpt_chat_service.request_nlp(message, courses, admin_id, preset_id, history)
+
+        # Answers depending on earlier turns are personal, so they are not shared with other sessions.
+        if history:
+            frames = produce()
+        else:
+            preset = preset_cache.resolve(self.db, admin_id, preset_id, course_titles_for(courses))
+            key = coalescing_key(admin_id, message, course_names_for(courses), preset)
+            frames = request_coalescer.run(key, produce)
+        parts = []
+        try:
+            async for frame in frames:
+                if "message" in frame:
+                    parts.append(frame["message"])
+                yield frame
+                if frame.get("done") and conversation is not None:
+                    await self.remember_turn(conversation, message, "".join(parts), gpt_chat_service)
+        finally:
+            await frames.aclose()
+
+    async def remember_turn(self, conversation: ConversationMemory, message: str, answer: str,
+                            gpt_chat_service: GptChatService) -> None:
+        """
+        Adds a finished turn to the session history after its answer was sent, compacting and saving it as needed.
+        """
+        conversation.add_turn(message, answer)
+        await conversation.compact(gpt_chat_service.llm)
+        if len(conversation.pending) >= 2 * settings.CHAT_HISTORY_FLUSH_TURNS:
+            ConversationService(self.db).flush(conversation)
 
     async def verify_external_token(self, token: str) -> tuple[int, str]:
         return await verify_external_token(token)
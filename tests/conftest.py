@@ -0,0 +1,149 @@
+"""
+Test setup: a SQLite database, eager Celery tasks on the in-memory broker and a local fake OpenAI server, so
+the indexing and chat pipelines run without external services. The environment has to be configured before
+chatplatform is imported, as its settings, database engine and Celery app are created at import time.
+"""
+import datetime
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+TEST_DIR = Path(tempfile.mkdtemp(prefix="chatplatform-tests-"))
+FAKE_OPENAI_PORT = free_port()
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DIR / 'test.db'}"
+os.environ["EMBEDDING_CACHE_PATH"] = str(TEST_DIR / "embeddings.sqlite3")
+os.environ["CELERY_BROKER_URL"] = "memory://"
+os.environ["CELERY_TASK_ALWAYS_EAGER"] = "true"
+os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{FAKE_OPENAI_PORT}/v1"
+os.environ["OPENAPI_KEY"] = "sk-test"
+
+from llama_index.core.postprocessor.types import BaseNodePostprocessor  # noqa: E402
+
+from chatplatform.db.base_class import Base  # noqa: E402
+from chatplatform.db.models import admin, chat_session, course, document, external_user, gpt_preset, \
+    indexing_job, refresh_token, user_course_association  # noqa: E402,F401
+from chatplatform.db.session import SessionLocal, engine  # noqa: E402
+from chatplatform.services.agent_pool_service import agent_pool  # noqa: E402
+from chatplatform.services.index_cache_service import index_cache  # noqa: E402
+from chatplatform.services.preset_cache_service import preset_cache  # noqa: E402
+from chatplatform.services.reranker_service import reranker_service  # noqa: E402
+
+engine.echo = False
+
+
+class KeepOrder(BaseNodePostprocessor):
+    """
+    Stands in for the cross-encoder, whose model would have to be downloaded.
+    """
+
+    def _postprocess_nodes(self, nodes, query_bundle=None):
+        return nodes[:reranker_service.top_n]
+
+
+def start_fake_openai(port: int, *args: str) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-m", "chatplatform.benchmarks.fake_openai", "--port", str(port),
+                                *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Fake OpenAI server did not start on port {port}")
+
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    """
+    The server behind OPENAI_API_BASE, answering quickly and streaming a word every 10 ms.
+    """
+    process = start_fake_openai(FAKE_OPENAI_PORT, "--first-token-delay", "0.05", "--token-delay", "0.01")
+    yield f"http://127.0.0.1:{FAKE_OPENAI_PORT}/v1"
+    process.terminate()
+    process.wait()
+
+
+@pytest.fixture(scope="session")
+def slow_openai():
+    """
+    A second fake server that takes 5 seconds to start answering.
+    """
+    port = free_port()
+    process = start_fake_openai(port, "--first-token-delay", "5")
+    yield f"http://127.0.0.1:{port}/v1"
+    process.terminate()
+    process.wait()
+
+
+@pytest.fixture
+def unreachable_openai():
+    return f"http://127.0.0.1:{free_port()}/v1"
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """
+    Gives every test an empty database and index storage, and a cold set of process-wide caches.
+    """
+    monkeypatch.setenv("STORAGE_PATH", str(tmp_path / "storage"))
+    monkeypatch.setattr(reranker_service, "get", lambda: KeepOrder())
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    for cache in (index_cache, agent_pool):
+        cache.clear()
+    preset_cache.invalidate()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def admin_user(db):
+    user = admin.AdminUser(username="admin", email="admin@example.com", password_hash="x",
+                           created_at=datetime.datetime.now())
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def make_course(db, admin_user, tmp_path):
+    """
+    Creates a course with one text document per given text, stored where uploads of the course would be.
+    """
+    def make(title: str, texts):
+        new_course = course.Course(title=title, description="", created_by=admin_user.id)
+        db.add(new_course)
+        db.commit()
+        course_dir = tmp_path / "documents" / title.replace(" ", "_")
+        course_dir.mkdir(parents=True)
+        now = datetime.datetime.now()
+        for i, text in enumerate(texts):
+            path = course_dir / f"doc{i}.txt"
+            path.write_text(text)
+            db.add(document.Document(course_id=new_course.id, filename=path.name, filepath=str(path),
+                                     file_type="text/plain", created_at=now, updated_at=now))
+        db.commit()
+        return new_course
+
+    return make
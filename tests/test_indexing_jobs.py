@@ -0,0 +1,123 @@
+import pytest
+
+from chatplatform.db.models.course import Course
+from chatplatform.db.models.document import Document
+from chatplatform.db.models.indexing_job import IndexingJob
+from chatplatform.db.session import SessionLocal
+from chatplatform.schemas.document import IndexingJobStatus
+from chatplatform.services.course_service import CourseService
+from chatplatform.services.document_indexer_service import DocumentIndexer, index_document_task
+from chatplatform.services.document_service import DocumentService
+from chatplatform.services.indexing_job_service import IndexingJobService
+
+pytestmark = pytest.mark.usefixtures("fake_openai")
+
+TEXTS = ["Assignment 3 is due on Friday.", "Quicksort sorts in place."]
+
+
+def job_status(job_id: int) -> str:
+    # Tasks commit through sessions of their own, so the status is read in a fresh one.
+    session = SessionLocal()
+    try:
+        return session.query(IndexingJob).filter(IndexingJob.id == job_id).one().status
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def observed_statuses(monkeypatch):
+    """
+    Records the status of the job as seen while the indexer works on it.
+    """
+    seen = []
+    index_document = DocumentIndexer.index_document
+
+    def observing(self, doc):
+        job = IndexingJobService(self.db).get_latest_job_for_document(doc.id)
+        seen.append(job_status(job.id))
+        return index_document(self, doc)
+
+    monkeypatch.setattr(DocumentIndexer, "index_document", observing)
+    return seen
+
+
+def test_indexing_job_goes_from_queued_through_running_to_done(db, make_course, observed_statuses):
+    course = make_course("Algorithms", TEXTS)
+    document = db.query(Document).filter(Document.course_id == course.id).first()
+
+    job = DocumentService(db).enqueue_indexing(document)
+
+    assert observed_statuses == [IndexingJobStatus.RUNNING.value]
+    db.refresh(job)
+    assert job.status == IndexingJobStatus.DONE.value
+    assert job.error is None
+    assert job.started_at <= job.finished_at
+    db.refresh(document)
+    assert document.doc_id is not None
+    assert DocumentIndexer(db).course_versions(["Algorithms"])["Algorithms"] is not None
+
+
+def test_job_is_queued_until_the_task_runs(db, make_course, monkeypatch):
+    course = make_course("Algorithms", TEXTS)
+    document = db.query(Document).filter(Document.course_id == course.id).first()
+    monkeypatch.setattr(index_document_task, "delay", lambda document_id, job_id: None)
+
+    job = DocumentService(db).enqueue_indexing(document)
+
+    assert job_status(job.id) == IndexingJobStatus.QUEUED.value
+    index_document_task.apply(args=(document.id, job.id))
+    assert job_status(job.id) == IndexingJobStatus.DONE.value
+
+
+def test_failing_indexing_marks_the_job_failed(db, make_course, monkeypatch):
+    course = make_course("Algorithms", TEXTS)
+    document = db.query(Document).filter(Document.course_id == course.id).first()
+
+    def fail(self, doc):
+        raise RuntimeError("embedding service unavailable")
+
+    monkeypatch.setattr(DocumentIndexer, "index_document", fail)
+    job = DocumentService(db).enqueue_indexing(document)
+
+    db.refresh(job)
+    assert job.status == IndexingJobStatus.FAILED.value
+    assert "embedding service unavailable" in job.error
+    assert job.finished_at is not None
+
+
+def test_job_for_missing_document_fails(db, make_course):
+    course = make_course("Algorithms", TEXTS)
+    job = IndexingJobService(db).create_job(course_id=course.id, document_id=12345)
+
+    index_document_task.apply(args=(12345, job.id))
+
+    assert job_status(job.id) == IndexingJobStatus.FAILED.value
+
+
+def test_queued_job_of_deleted_course_does_not_write(db, make_course, monkeypatch):
+    course = make_course("Algorithms", TEXTS)
+    document = db.query(Document).filter(Document.course_id == course.id).first()
+    monkeypatch.setattr(index_document_task, "delay", lambda document_id, job_id: None)
+    job = DocumentService(db).enqueue_indexing(document)
+    # Deleted while the job was queued; the worker may still find the document row.
+    db.query(Course).filter(Course.id == course.id).delete()
+    db.commit()
+
+    index_document_task.apply(args=(document.id, job.id))
+
+    assert job_status(job.id) == IndexingJobStatus.FAILED.value
+    assert DocumentIndexer(db).course_versions(["Algorithms"])["Algorithms"] is None
+
+
+def test_deleting_a_course_purges_its_storage_in_a_job(db, make_course):
+    course = make_course("Algorithms", TEXTS)
+    for document in db.query(Document).filter(Document.course_id == course.id):
+        DocumentService(db).enqueue_indexing(document)
+    course_dir = DocumentIndexer(db).storage_path / "Algorithms"
+    assert course_dir.exists()
+
+    assert CourseService(db).delete_course(course.id)
+
+    purge_job = db.query(IndexingJob).filter(IndexingJob.document_id.is_(None)).one()
+    assert purge_job.status == IndexingJobStatus.DONE.value
+    assert not course_dir.exists()
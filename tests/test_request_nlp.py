@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from chatplatform.benchmarks.fake_openai import ANSWER
+from chatplatform.core.config import settings
+from chatplatform.db.models.document import Document
+from chatplatform.services.course_service import CourseService
+from chatplatform.services.document_service import DocumentService
+from chatplatform.services.gpt_chat_service import ERROR_MESSAGE, TIMEOUT_MESSAGE, GptChatService
+from chatplatform.services.llm_client_service import HedgedOpenAI
+
+pytestmark = pytest.mark.usefixtures("fake_openai")
+
+QUESTION = "When is assignment 3 due?"
+
+
+@pytest.fixture
+def courses(db, admin_user, make_course):
+    course = make_course("Algorithms", ["Assignment 3 is due on Friday.", "Quicksort sorts in place."])
+    for document in db.query(Document).filter(Document.course_id == course.id):
+        DocumentService(db).enqueue_indexing(document)
+    return asyncio.run(CourseService(db).get_courses_by_admin_id(admin_user.id))
+
+
+def answer_frames(service: GptChatService, courses, admin_id: int) -> list:
+    async def collect():
+        return [frame async for frame in service.request_nlp(QUESTION, courses, admin_id)]
+
+    return asyncio.run(collect())
+
+
+def test_answer_is_streamed_in_coalesced_frames_followed_by_done(db, admin_user, courses, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_FRAME_INTERVAL_MS", 100)
+
+    frames = answer_frames(GptChatService(db), courses, admin_user.id)
+
+    messages = [frame["message"] for frame in frames if "message" in frame]
+    done = frames[-1]
+    assert "".join(messages) == ANSWER
+    # The fake model streams one word every 10 ms, so frames 100 ms apart carry several words each.
+    assert 1 <= len(messages) < len(ANSWER.split(" "))
+    assert done["done"] is True
+    assert done["cached"] is False
+    assert done["mode"] == "agent"
+    assert done["frames"] == len(messages)
+    assert done["characters"] == len(ANSWER)
+    assert 0 < done["time_to_first_token_ms"] <= done["duration_ms"]
+    assert set(done["sources"]) <= {"doc0.txt", "doc1.txt"}
+    assert not any("error" in frame for frame in frames)
+
+
+def test_every_token_is_a_frame_without_coalescing(db, admin_user, courses, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_FRAME_INTERVAL_MS", 0)
+
+    frames = answer_frames(GptChatService(db), courses, admin_user.id)
+
+    messages = [frame["message"] for frame in frames if "message" in frame]
+    assert len(messages) == len(ANSWER.split(" "))
+    assert frames[-1]["frames"] == len(messages)
+
+
+def test_answer_exceeding_its_deadline_ends_with_timeout_frame(db, admin_user, courses, slow_openai, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_DEADLINE_SECONDS", 0.5)
+    monkeypatch.setattr(settings, "LLM_DEADLINE_TOKENS_PER_SECOND", 1e9)
+    llm = HedgedOpenAI(model=settings.DEFAULT_CHAT_MODEL, api_base=slow_openai, max_retries=0)
+
+    frames = answer_frames(GptChatService(db, llm=llm), courses, admin_user.id)
+
+    assert frames[-1] == {"error": TIMEOUT_MESSAGE}
+    assert not any(frame.get("done") for frame in frames)
+
+
+def test_unreachable_model_ends_with_error_frame(db, admin_user, courses, unreachable_openai, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_DEADLINE_SECONDS", 5.0)
+    llm = HedgedOpenAI(model=settings.DEFAULT_CHAT_MODEL, api_base=unreachable_openai, max_retries=0)
+
+    frames = answer_frames(GptChatService(db, llm=llm), courses, admin_user.id)
+
+    assert frames[-1] == {"error": ERROR_MESSAGE}
+    assert not any("message" in frame for frame in frames)